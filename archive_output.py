@@ -0,0 +1,76 @@
+import io
+import time
+import tarfile
+import zipfile
+import threading
+from pathlib import Path
+
+# --- Salida de la exportación a un archivo comprimido ---
+# Las notas, el MOC y los adjuntos se escriben directamente en un .zip o .tar.gz,
+# sin pasar antes por Notes/ y Assets/ en disco. Los adjuntos se copian al archivo
+# por bloques, así que la memoria no depende del tamaño de la exportación.
+# En zip, los formatos que ya están comprimidos se guardan sin recomprimir; en
+# tar.gz la compresión se aplica a todo el flujo y no se puede elegir por archivo.
+ARCHIVE_FORMATS = ("zip", "tar.gz")
+ARCHIVE_EXTENSIONS = {"zip": ".zip", "tar.gz": ".tar.gz"}
+STORED_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.pdf', '.zip', '.gz', '.mp3', '.mp4'}
+DEFAULT_COMPRESSION_LEVEL = 6
+
+
+class ArchiveWriter:
+    """
+    Escribe entradas en un archivo zip o tar.gz desde varios hilos (las escrituras se
+    serializan con un lock). Se escribe en `<nombre>.partial` y solo se renombra al
+    nombre final en `close()`; `abort()` descarta el archivo incompleto.
+    """
+    def __init__(self, path: Path, archive_format: str = "zip", compression_level: int = DEFAULT_COMPRESSION_LEVEL):
+        if archive_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unknown archive format: {archive_format}")
+        self.path = path
+        self.archive_format = archive_format
+        self.compression_level = compression_level
+        self._partial_path = path.with_name(path.name + ".partial")
+        self._lock = threading.Lock()
+        if archive_format == "zip":
+            self._archive = zipfile.ZipFile(self._partial_path, 'w', compression=zipfile.ZIP_DEFLATED,
+                                            compresslevel=compression_level, allowZip64=True)
+        else:
+            # dereference: los enlaces simbólicos (y duros) se guardan con su contenido, como
+            # en zip y en la exportación en carpeta, no como entradas de enlace
+            self._archive = tarfile.open(self._partial_path, 'w:gz', compresslevel=compression_level,
+                                         dereference=True)
+
+    def write_text(self, arcname: str, text: str):
+        data = text.encode('utf-8')
+        with self._lock:
+            if self.archive_format == "zip":
+                info = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+                info.external_attr = 0o644 << 16
+                self._archive.writestr(info, data, compress_type=zipfile.ZIP_DEFLATED,
+                                       compresslevel=self.compression_level)
+            else:
+                info = tarfile.TarInfo(arcname)
+                info.size, info.mtime, info.mode = len(data), time.time(), 0o644
+                self._archive.addfile(info, io.BytesIO(data))
+
+    def write_file(self, arcname: str, source: Path):
+        """Copia `source` en el archivo por bloques, sin cargarlo entero en memoria."""
+        with self._lock:
+            if self.archive_format == "zip":
+                stored = source.suffix.lower() in STORED_EXTENSIONS
+                self._archive.write(source, arcname,
+                                    compress_type=zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED,
+                                    compresslevel=None if stored else self.compression_level)
+            else:
+                self._archive.add(source, arcname, recursive=False)
+
+    def close(self):
+        self._archive.close()
+        self._partial_path.replace(self.path)
+
+    def abort(self):
+        try:
+            self._archive.close()
+        finally:
+            self._partial_path.unlink(missing_ok=True)
+
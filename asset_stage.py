@@ -0,0 +1,229 @@
+import os
+import shutil
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# --- Estrategias de copia de adjuntos ---
+# copy:     copia normal (shutil.copy).
+# reflink:  clon copy-on-write (FICLONE) si el sistema de archivos lo admite;
+#           si no, copia dentro del kernel con copy_file_range y, en último caso, copia normal.
+# hardlink: enlace duro al archivo del vault. No ocupa espacio, pero editar la
+#           exportación modificaría el vault. Si falla (otro disco), copia normal. Las
+#           imágenes optimizadas (de la caché de ImageStage) se copian siempre.
+COPY_STRATEGIES = ("copy", "reflink", "hardlink")
+FICLONE = 0x40049409
+
+
+def file_hash(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _reflink_or_copy_range(source: Path, destination: Path) -> bool:
+    """Copia `source` en `destination`. Devuelve True si se pudo clonar sin copiar datos."""
+    with open(source, 'rb') as fsrc, open(destination, 'wb') as fdst:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                return True
+            except OSError:
+                pass
+        if hasattr(os, "copy_file_range"):
+            try:
+                while os.copy_file_range(fsrc.fileno(), fdst.fileno(), 1024 * 1024 * 64):
+                    pass
+                return False
+            except OSError:
+                fsrc.seek(0); fdst.seek(0); fdst.truncate()
+        shutil.copyfileobj(fsrc, fdst)
+    return False
+
+
+class AssetStage:
+    """
+    Copia los adjuntos de la exportación en segundo plano con un pool de hilos.
+    Los archivos con el mismo contenido (mismo hash) se guardan una sola vez: las
+    copias posteriores son enlaces duros al primero. Con `previous_entries` (modo
+    actualización) no se vuelve a copiar un adjunto cuyo contenido no ha cambiado.
+    Con `archive` (un ArchiveWriter) los adjuntos se escriben en el archivo comprimido
+    y no se usan la estrategia de copia ni los enlaces duros.
+    Con `image_stage` (un ImageStage) las imágenes se copian desde su versión optimizada
+    en la caché en lugar de desde el vault.
+    """
+    def __init__(self, assets_dir: Path, strategy: str = "copy", workers: int = 4,
+                 previous_entries: dict | None = None, metrics=None, archive=None, image_stage=None):
+        if strategy not in COPY_STRATEGIES:
+            raise ValueError(f"Unknown asset copy strategy: {strategy}")
+        self.assets_dir = assets_dir
+        self.strategy = strategy
+        self.previous_entries = previous_entries or {}
+        self.metrics = metrics
+        self.archive = archive
+        self.image_stage = image_stage
+        self.entries = {}
+        self.files_copied = self.files_avoided = 0
+        self.bytes_copied = self.bytes_avoided = 0
+        self._by_hash = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._futures = []
+
+    def submit(self, source: Path, output_name: str):
+        """Encola la copia de `source` como Assets/<output_name>."""
+        self._futures.append(self._pool.submit(self._process, source, output_name))
+
+    def close(self):
+        """Espera a que terminen todas las copias encoladas."""
+        self._pool.shutdown(wait=True)
+        for future in self._futures:
+            future.result()
+
+    def _process(self, source: Path, output_name: str):
+        try:
+            if self.metrics is None:
+                self._process_asset(source, output_name)
+            else:
+                with self.metrics.phase("asset_copy"):
+                    self._process_asset(source, output_name)
+        except Exception as e:
+            logging.error(f"Could not copy asset {source}: {e}")
+
+    def _process_asset(self, source: Path, output_name: str):
+        stat = source.stat()
+        output = f"{self.assets_dir.name}/{output_name}"
+        destination = self.assets_dir / output_name
+        transform = self._transform_key(source, output_name)
+        if self.archive is not None:
+            content_hash = file_hash(source)
+            source_file, transform = self._transformed(source, output, content_hash, transform)
+            self.archive.write_file(output, source_file)
+            self._record(source, output, stat, content_hash, transform, copied=True,
+                         written=source_file.stat().st_size)
+            return
+
+        previous = self.previous_entries.get(str(source))
+        reusable = (previous is not None and previous["output"] == output and destination.exists()
+                    and previous.get("transform") == transform)
+
+        if reusable and previous["mtime_ns"] == stat.st_mtime_ns and previous["size"] == stat.st_size:
+            content_hash = previous["hash"]
+            self._record(source, output, stat, content_hash, transform, copied=False)
+            return
+
+        content_hash = file_hash(source)
+        if reusable and previous["hash"] == content_hash:
+            self._record(source, output, stat, content_hash, transform, copied=False)
+            return
+
+        # El primer adjunto con un hash dado se materializa; los demás enlazan a él.
+        # La extensión de salida forma parte de la clave: la imagen optimizada depende de ella.
+        dedupe_key = (content_hash, destination.suffix.lower())
+        with self._lock:
+            original = self._by_hash.get(dedupe_key)
+            if original is None:
+                done = threading.Event()
+                self._by_hash[dedupe_key] = (destination, done)
+        destination.unlink(missing_ok=True)
+
+        if original is not None:
+            original_destination, original_done = original
+            original_done.wait()
+            try:
+                os.link(original_destination, destination)
+                self._record(source, output, stat, content_hash, transform, copied=False)
+                return
+            except OSError:
+                pass
+
+        try:
+            source_file, transform = self._transformed(source, output, content_hash, transform)
+            copied = self._materialize(source_file, destination, source)
+        finally:
+            if original is None:
+                done.set()
+        self._record(source, output, stat, content_hash, transform, copied=copied,
+                     written=source_file.stat().st_size)
+
+    def _transform_key(self, source: Path, output_name: str) -> str | None:
+        """
+        Huella de los ajustes con que se optimiza `source`, o None si se copia tal cual:
+        también si el nombre de salida conserva la extensión original porque la conversión
+        de formato falló al nombrar el adjunto.
+        """
+        if self.image_stage is None or not self.image_stage.handles(source):
+            return None
+        if not self.image_stage.same_format(self.image_stage.output_suffix(source), Path(output_name).suffix):
+            return None
+        return self.image_stage.key
+
+    def _transformed(self, source: Path, output: str, content_hash: str,
+                     transform: str | None) -> tuple[Path, str | None]:
+        """
+        Archivo a copiar para `source` y huella a guardar: su versión optimizada o, si no
+        hay o falla la optimización, el original (y None, para reintentarla la próxima vez).
+        Si la optimización cambiaba el formato y falla, no se copia nada: el original no
+        puede guardarse con la extensión de `output`.
+        """
+        if transform is None:
+            return source, None
+        try:
+            return self.image_stage.transform(source, content_hash, self.metrics), transform
+        except Exception as e:
+            if not self.image_stage.same_format(source.suffix, Path(output).suffix):
+                raise RuntimeError(f"could not convert image to {Path(output).suffix}: {e}") from e
+            logging.warning(f"Could not optimize image {source}, copying it unchanged: {e}")
+            return source, None
+
+    def _materialize(self, source: Path, destination: Path, original: Path) -> bool:
+        """
+        Crea `destination` a partir de `source` con la estrategia elegida. Devuelve True si
+        se copiaron datos. Si `source` no es el `original` del vault sino una imagen de la
+        caché, no se enlaza: editar la exportación modificaría la caché compartida.
+        """
+        if self.strategy == "hardlink" and source == original:
+            try:
+                os.link(source, destination)
+                return False
+            except OSError:
+                pass
+        elif self.strategy == "reflink":
+            copied = not _reflink_or_copy_range(source, destination)
+            shutil.copymode(source, destination)
+            return copied
+        shutil.copy(source, destination)
+        return True
+
+    def _record(self, source: Path, output: str, stat: os.stat_result, content_hash: str,
+                transform: str | None, copied: bool, written: int | None = None):
+        """`written` es el tamaño copiado si difiere del original (imagen optimizada)."""
+        written = stat.st_size if written is None else written
+        with self._lock:
+            self.entries[source] = {
+                "source": str(source),
+                "output": output,
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "hash": content_hash,
+                "transform": transform,
+            }
+            if copied:
+                self.files_copied += 1
+                self.bytes_copied += written
+            else:
+                self.files_avoided += 1
+                self.bytes_avoided += written
+        if self.metrics is not None:
+            self.metrics.count("assets_copied" if copied else "assets_avoided")
+            self.metrics.count("asset_bytes_copied" if copied else "asset_bytes_avoided", written)
+            self.metrics.append("assets", {"output": output, "size": written, "copied": copied})
@@ -0,0 +1,176 @@
+import sys
+import json
+import time
+import logging
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from vault_index import MultiVaultIndex, resolve_target
+from asset_stage import COPY_STRATEGIES
+from archive_output import ARCHIVE_FORMATS, DEFAULT_COMPRESSION_LEVEL
+from image_stage import ImageStage, image_settings_from_config
+from export_builder import (ExportBuilder, CONFIG_FILE, INDEX_CACHE_DIR, IMAGE_CACHE_DIR, load_app_config,
+                            load_export_manifest)
+
+# --- Exportación por lotes sin interfaz ---
+# El archivo de trabajos es un JSON con una lista de exportaciones (o un objeto con
+# la clave "jobs"):
+#
+#     [{"start_note": "Temas/Rust.md", "depth": 2, "output_name": "Rust"}, ...]
+#
+# `start_note` puede ser una ruta absoluta, una ruta relativa a un vault o el nombre
+# de la nota; el vault de cada trabajo es el que contiene su nota de inicio. Los
+# índices de los vaults se construyen una sola vez y se comparten entre todos los
+# trabajos. Si la carpeta `output_name` ya contiene una exportación con
+# manifiesto, se actualiza en lugar de crearse de nuevo. Con --archive cada trabajo
+# genera `output_name.zip` (o .tar.gz), que se reemplaza entero en cada ejecución.
+# Todos los trabajos comparten la etapa de optimización de imágenes y su caché.
+SUMMARY_FILE_NAME = "batch_summary.json"
+
+
+def load_jobs(jobs_file: Path) -> list[dict]:
+    with open(jobs_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    jobs = data.get("jobs", []) if isinstance(data, dict) else data
+    names = set()
+    for i, job in enumerate(jobs):
+        if not job.get("start_note") or not job.get("output_name"):
+            raise ValueError(f"Job {i} needs 'start_note' and 'output_name'.")
+        if job["output_name"] in names:
+            raise ValueError(f"Duplicate output name in job file: {job['output_name']}")
+        names.add(job["output_name"])
+        job.setdefault("depth", 1)
+    return jobs
+
+
+def resolve_start_note(vaults: MultiVaultIndex, start_note: str) -> tuple[Path, Path] | None:
+    """Devuelve (vault, ruta) de la nota de inicio, buscándola en los vaults en orden."""
+    candidate = Path(start_note)
+    if candidate.is_absolute():
+        vault_path = vaults.owning_vault(candidate)
+        return (vault_path, candidate) if vault_path and candidate.is_file() else None
+    for vault_path in vaults.indexes:
+        if (vault_path / candidate).is_file():
+            return vault_path, vault_path / candidate
+    for vault_path, index in vaults.indexes.items():
+        note_path = resolve_target(index, candidate.name)
+        if note_path:
+            return vault_path, note_path
+    return None
+
+
+def run_job(job: dict, vaults: MultiVaultIndex, export_dir: Path, exclude_folders: list, cross_vault: bool,
+            options: dict) -> dict:
+    """Ejecuta un trabajo y devuelve su resultado para el resumen; nunca lanza excepciones."""
+    result = {"output_name": job["output_name"], "start_note": job["start_note"], "depth": job["depth"]}
+    started = time.perf_counter()
+    try:
+        found = resolve_start_note(vaults, job["start_note"])
+        if not found:
+            raise FileNotFoundError(f"Start note not found in any vault: {job['start_note']}")
+        vault_path, start_note_path = found
+        export_root = export_dir / job["output_name"]
+        update_dir = export_root if not options.get("archive_format") and load_export_manifest(export_root) else None
+        fallback_vaults = {v: index for v, index in vaults.indexes.items() if v != vault_path} if cross_vault else {}
+        builder = ExportBuilder(vault_path, export_dir, exclude_folders, update_dir=update_dir,
+                                vault_index=vaults.indexes[vault_path], fallback_vaults=fallback_vaults,
+                                export_name=job["output_name"], **options)
+        builder.run(start_note_path, job["depth"])
+        result.update(status="ok", vault=str(vault_path), update=update_dir is not None, export_root=str(builder.export_root),
+                      notes=len(builder.visited_notes), assets=len(builder.asset_stage.entries),
+                      counters=dict(builder.metrics.counters))
+    except Exception as e:
+        logging.error(f"Job '{job['output_name']}' failed: {e}")
+        result.update(status="failed", error=f"{type(e).__name__}: {e}")
+    result["wall_s"] = time.perf_counter() - started
+    return result
+
+
+def main():
+    """Ejecuta todas las exportaciones de un archivo de trabajos sin diálogos ni menús."""
+    parser = argparse.ArgumentParser(description="Exporta por lotes varias notas de inicio con un único índice.")
+    parser.add_argument("jobs_file", type=Path, help="JSON con los trabajos (start_note, depth, output_name).")
+    parser.add_argument("--vault", help=f"Ruta del vault (por defecto, todos los de {CONFIG_FILE}).")
+    parser.add_argument("--cross-vault", action="store_true",
+                        help="Resuelve en los demás vaults los enlaces que no existen en el de la nota.")
+    parser.add_argument("--export-dir", help="Carpeta de destino (por defecto, la de la configuración).")
+    parser.add_argument("--jobs", type=int, default=1, metavar="N", help="Trabajos ejecutados a la vez.")
+    parser.add_argument("--workers", type=int, default=1, metavar="N",
+                        help="Hilos de lectura y escritura de notas por trabajo.")
+    parser.add_argument("--asset-strategy", choices=COPY_STRATEGIES, default="copy")
+    parser.add_argument("--asset-workers", type=int, default=4, metavar="N")
+    parser.add_argument("--archive", choices=ARCHIVE_FORMATS, help="Genera cada paquete como .zip o .tar.gz.")
+    parser.add_argument("--compression-level", type=int, default=DEFAULT_COMPRESSION_LEVEL, metavar="0-9")
+    parser.add_argument("--rebuild-index", action="store_true", help="Ignora la caché del índice del vault.")
+    parser.add_argument("--summary", type=Path,
+                        help=f"Ruta del resumen JSON (por defecto, {SUMMARY_FILE_NAME} en la carpeta de destino).")
+    args = parser.parse_args()
+    if args.jobs < 1 or args.workers < 1 or args.asset_workers < 1:
+        parser.error("--jobs, --workers and --asset-workers must be at least 1")
+    if not 0 <= args.compression_level <= 9:
+        parser.error("--compression-level must be between 0 and 9")
+
+    # Con --vault y --export-dir el archivo de configuración es opcional
+    config = (load_app_config() if CONFIG_FILE.exists() or not (args.vault and args.export_dir) else None) or {}
+    vault_paths = [args.vault] if args.vault else config.get("vault_paths", [])
+    export_dir = args.export_dir or config.get("export_dir")
+    if not vault_paths or not export_dir:
+        logging.error("Vault path or export directory not configured. Use --vault/--export-dir or run 'config_tool.py'.")
+        sys.exit(1)
+    vault_paths, export_dir = [Path(v) for v in vault_paths], Path(export_dir)
+    exclude_folders = config.get("exclude_folders", [])
+
+    try:
+        jobs = load_jobs(args.jobs_file)
+    except (OSError, ValueError) as e:
+        logging.error(f"Could not read job file {args.jobs_file}: {e}")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    logging.info(f"Building index for {len(vault_paths)} vault(s)...")
+    vaults = MultiVaultIndex.load(vault_paths, exclude_folders, INDEX_CACHE_DIR, rebuild=args.rebuild_index)
+    index_time = time.perf_counter() - started
+    logging.info(f"Indexes built in {index_time:.2f}s; running {len(jobs)} jobs.")
+
+    image_stage = ImageStage.create(IMAGE_CACHE_DIR, image_settings_from_config(config))
+    options = {"workers": args.workers, "asset_strategy": args.asset_strategy, "asset_workers": args.asset_workers,
+               "archive_format": args.archive, "compression_level": args.compression_level,
+               "image_stage": image_stage}
+    try:
+        with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(pool.map(
+                lambda job: run_job(job, vaults, export_dir, exclude_folders, args.cross_vault, options), jobs))
+    finally:
+        if image_stage:
+            image_stage.close()
+
+    failed = [r for r in results if r["status"] != "ok"]
+    summary = {
+        "vaults": [str(v) for v in vault_paths],
+        "jobs": len(results),
+        "succeeded": len(results) - len(failed),
+        "failed": len(failed),
+        "index_s": index_time,
+        "total_wall_s": time.perf_counter() - started,
+        "results": results,
+    }
+    summary_path = args.summary or export_dir / SUMMARY_FILE_NAME
+    export_dir.mkdir(parents=True, exist_ok=True)
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"\n{'Output':<30} {'Status':<8} {'Notes':>7} {'Assets':>7} {'Time':>9}")
+    for r in results:
+        print(f"{r['output_name'][:30]:<30} {r['status']:<8} {r.get('notes', '-'):>7} "
+              f"{r.get('assets', '-'):>7} {r['wall_s']:>8.2f}s")
+    for r in failed:
+        print(f"  {r['output_name']}: {r['error']}")
+    logging.info(f"Batch finished: {summary['succeeded']} ok, {summary['failed']} failed "
+                 f"in {summary['total_wall_s']:.2f}s. Summary written to: {summary_path}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
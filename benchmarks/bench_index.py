@@ -0,0 +1,147 @@
+"""
+Micro-benchmark del índice compacto del vault frente al diccionario anterior.
+
+Construye ambos índices a partir del mismo listado sintético de directorios (sin
+tocar el disco) y compara el tiempo de construcción, la memoria que ocupan y el
+tiempo de resolver enlaces (también con la caché de `find_file_in_vault`).
+
+    python benchmarks/bench_index.py [--files 50000 300000] [--collisions 0.05] [--repeat 3]
+"""
+import os
+import sys
+import gc
+import json
+import random
+import timeit
+import argparse
+import tracemalloc
+from pathlib import Path
+from urllib.parse import unquote
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from vault_index import VaultIndex  # noqa: E402
+
+FILES_PER_FOLDER = 500
+VAULT_ROOT = os.path.join(os.sep, "bench", "vault")
+
+
+# Índice anterior, conservado solo para comparar: dos claves por archivo (nombre y
+# stem en minúsculas) con la ruta completa; en caso de colisión gana el último.
+def legacy_build_index(vault_path: Path, dirs: dict) -> dict:
+    root = str(vault_path)
+    index = {}
+    for rel_dir, (_, files, _) in dirs.items():
+        full_dir = os.path.join(root, rel_dir) if rel_dir else root
+        for file in files:
+            full_path = os.path.join(full_dir, file)
+            index[os.path.splitext(file)[0].lower()] = full_path
+            index[file.lower()] = full_path
+    return index
+
+
+def legacy_resolve(index: dict, target: str) -> Path | None:
+    clean_target = unquote(target.strip()).lower()
+    path = index.get(clean_target) or index.get(Path(clean_target).stem)
+    return Path(path) if path else None
+
+
+def make_dirs(files: int, collisions: float, seed: int = 0) -> dict:
+    """Listado sintético: notas y adjuntos en carpetas de 500 archivos; una parte repite nombres de otras carpetas."""
+    rng = random.Random(seed)
+    dirs = {"": [0, [], []]}
+    names = []
+    for i in range(files):
+        folder = f"Area {i // (FILES_PER_FOLDER * 10):03d}/Folder {i // FILES_PER_FOLDER:04d}"
+        if folder not in dirs:
+            area = folder.split("/")[0]
+            if area not in dirs:
+                dirs[area] = [0, [], []]
+                dirs[""][2].append(area)
+            dirs[area][2].append(folder.split("/")[1])
+            dirs[folder] = [0, [], []]
+        if names and rng.random() < collisions:
+            name = rng.choice(names)
+        elif i % 5 == 0:
+            name = f"Image {i:07d}.png"
+        else:
+            name = f"Note {i:07d}.md"
+        names.append(name)
+        dirs[folder][1].append(name)
+    return dirs
+
+
+def make_targets(dirs: dict, count: int, seed: int = 1) -> list[str]:
+    """Destinos de enlace: por stem, por nombre con extensión y con carpeta."""
+    rng = random.Random(seed)
+    files = [(rel_dir, name) for rel_dir, (_, names, _) in dirs.items() for name in names]
+    targets = []
+    for _ in range(count):
+        rel_dir, name = rng.choice(files)
+        kind = rng.randrange(3)
+        if kind == 0:
+            targets.append(os.path.splitext(name)[0])
+        elif kind == 1:
+            targets.append(name)
+        else:
+            targets.append(f"{rel_dir.split('/')[-1]}/{os.path.splitext(name)[0]}")
+    return targets
+
+
+def measure_memory(build) -> tuple[int, object]:
+    """Bytes que siguen asignados tras construir el índice (incluye claves y rutas)."""
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    index = build()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return after - before, index
+
+
+def memoized(resolve):
+    cache = {}
+
+    def lookup(target):
+        if target not in cache:
+            cache[target] = resolve(target)
+        return cache[target]
+    return lookup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, nargs="+", default=[50000, 300000])
+    parser.add_argument("--collisions", type=float, default=0.05,
+                        help="Fracción de archivos que repiten el nombre de otro archivo.")
+    parser.add_argument("--links", type=int, default=200000, help="Enlaces resueltos en la prueba de resolución.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="Guarda los resultados en este archivo JSON.")
+    args = parser.parse_args()
+
+    vault_path = Path(VAULT_ROOT)
+    results = []
+    print(f"{'files':>8} {'index':>8} {'build ms':>9} {'MB':>8} {'resolve ms':>11} {'memo ms':>8}")
+    for files in args.files:
+        dirs = make_dirs(files, args.collisions)
+        # Enlaces con repetición, como en una exportación real (muchas notas enlazan a las mismas)
+        targets = make_targets(dirs, args.links // 4) * 4
+        for name, build, resolve in (
+                ("dict", lambda: legacy_build_index(vault_path, dirs), legacy_resolve),
+                ("compact", lambda: VaultIndex.from_dirs(vault_path, dirs), VaultIndex.resolve)):
+            build_s = min(timeit.repeat(build, number=1, repeat=args.repeat))
+            memory, index = measure_memory(build)
+            resolve_s = min(timeit.repeat(lambda: [resolve(index, t) for t in targets], number=1, repeat=args.repeat))
+            memo_s = min(timeit.repeat(lambda: list(map(memoized(lambda t: resolve(index, t)), targets)),
+                                       number=1, repeat=args.repeat))
+            results.append({"files": files, "index": name, "build_s": build_s, "memory_bytes": memory,
+                            "resolve_s": resolve_s, "memoized_resolve_s": memo_s, "links": len(targets)})
+            print(f"{files:>8} {name:>8} {build_s * 1000:>9.1f} {memory / 1e6:>8.1f} "
+                  f"{resolve_s * 1000:>11.1f} {memo_s * 1000:>8.1f}")
+            del index
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding='utf-8')
+
+
+if __name__ == "__main__":
+    main()
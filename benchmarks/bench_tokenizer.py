@@ -0,0 +1,90 @@
+"""
+Micro-benchmark del tokenizador de enlaces frente a los patrones anteriores.
+
+Compara, sobre notas grandes generadas, las tres pasadas de regex que hacía
+ExportBuilder (LINK_PATTERN.sub para embeds, MD_IMAGE_PATTERN.sub para imágenes y
+LINK_PATTERN.finditer para los enlaces) con la pasada única de `rewrite_links`.
+
+    python benchmarks/bench_tokenizer.py [--sizes 100 1000 10000] [--repeat 5]
+"""
+import re
+import sys
+import json
+import random
+import timeit
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from link_tokenizer import rewrite_links  # noqa: E402
+
+# Patrones usados antes del tokenizador, conservados solo para comparar
+LEGACY_LINK_PATTERN = re.compile(r'(!?)\[\[([^|#\]]+)(?:\|([^\]]+))?\]\]')
+LEGACY_MD_IMAGE_PATTERN = re.compile(r'!\[(.*?)\]\((.*?)\)')
+
+
+def make_note(paragraphs: int, seed: int = 0) -> str:
+    """Genera una nota con prosa, wikilinks, embeds, imágenes y bloques de código."""
+    rng = random.Random(seed)
+    words = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor".split()
+    parts = ["---\ntitle: Benchmark\n---\n"]
+    for i in range(paragraphs):
+        text = " ".join(rng.choice(words) for _ in range(40))
+        parts.append(f"## Section {i}\n{text} [[Note {rng.randrange(500)}]] and [[Note {rng.randrange(500)}|alias]].\n")
+        if i % 3 == 0:
+            parts.append(f"![[image_{rng.randrange(100)}.png]]\n")
+        if i % 5 == 0:
+            parts.append(f"![figure](figures/plot_{rng.randrange(100)}.png)\n")
+        if i % 7 == 0:
+            parts.append("```python\nprint('[[not a link]]')\n```\n")
+    return "\n".join(parts)
+
+
+def _replace(target, alias):
+    return f"![{alias or target}](../Assets/{target})"
+
+
+def legacy_three_pass(content: str):
+    def embed_replacer(match):
+        is_embed, target, alias = match.groups()
+        return _replace(target, alias) if is_embed else match.group(0)
+
+    def image_replacer(match):
+        alias, target = match.groups()
+        return _replace(target, alias)
+
+    rewritten = LEGACY_LINK_PATTERN.sub(embed_replacer, content)
+    rewritten = LEGACY_MD_IMAGE_PATTERN.sub(image_replacer, rewritten)
+    links = [m.group(2) for m in LEGACY_LINK_PATTERN.finditer(content) if not m.group(1)]
+    return rewritten, links
+
+
+def single_pass(content: str):
+    return rewrite_links(content, _replace)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000],
+                        help="Número de secciones de cada nota generada.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="Guarda los resultados en este archivo JSON.")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'sections':>9} {'KB':>8} {'legacy ms':>10} {'single ms':>10} {'speedup':>8}")
+    for size in args.sizes:
+        content = make_note(size)
+        number = max(1, 2000 // size)
+        legacy = min(timeit.repeat(lambda: legacy_three_pass(content), number=number, repeat=args.repeat)) / number
+        single = min(timeit.repeat(lambda: single_pass(content), number=number, repeat=args.repeat)) / number
+        results.append({"sections": size, "bytes": len(content.encode('utf-8')),
+                        "legacy_s": legacy, "single_pass_s": single})
+        print(f"{size:>9} {len(content) / 1024:>8.1f} {legacy * 1000:>10.2f} {single * 1000:>10.2f} {legacy / single:>7.2f}x")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding='utf-8')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Generador de vaults sintéticos y reproducibles para los benchmarks.
+
+    python benchmarks/generate_vault.py DESTINO --notes 10000 --shape small-world --fanout 5
+
+El mismo `--seed` con los mismos parámetros produce siempre el mismo vault.
+"""
+import random
+import argparse
+from pathlib import Path
+
+GRAPH_SHAPES = ("tree", "small-world", "hub")
+NOTES_PER_FOLDER = 500
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+         "incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud").split()
+
+
+def note_name(i: int) -> str:
+    return f"Note {i:06d}"
+
+
+def build_edges(notes: int, fanout: int, shape: str, rng: random.Random) -> list[list[int]]:
+    """Devuelve, para cada nota, la lista de notas a las que enlaza."""
+    edges = [[] for _ in range(notes)]
+    if shape == "tree":
+        # Cada nota enlaza a sus `fanout` hijas; la raíz es la nota 0
+        for i in range(notes):
+            edges[i] = [c for c in range(i * fanout + 1, i * fanout + fanout + 1) if c < notes]
+    elif shape == "small-world":
+        # Watts-Strogatz: anillo con vecinos cercanos y un 10% de enlaces recableados al azar
+        for i in range(notes):
+            for k in range(1, fanout + 1):
+                target = (i + k) % notes if rng.random() > 0.1 else rng.randrange(notes)
+                if target != i:
+                    edges[i].append(target)
+    elif shape == "hub":
+        # Barabási-Albert: las notas nuevas enlazan preferentemente a las más enlazadas
+        pool = [0]
+        for i in range(1, notes):
+            targets = {rng.choice(pool) for _ in range(min(fanout, i))}
+            edges[i] = sorted(targets)
+            pool.extend(targets)
+            pool.append(i)
+        # Los hubs también enlazan hacia atrás para que todo sea alcanzable desde la nota 0
+        for i in range(1, notes):
+            edges[rng.randrange(i)].append(i)
+    else:
+        raise ValueError(f"Unknown graph shape: {shape}")
+    return edges
+
+
+def generate_vault(root: Path, notes: int = 1000, fanout: int = 5, shape: str = "small-world",
+                   attachments: int = 100, attachment_size: int = 50_000,
+                   excluded_folders: tuple = (".obsidian", ".trash"), excluded_notes: int = 20,
+                   seed: int = 0) -> dict:
+    """Crea el vault en `root` y devuelve un resumen con sus parámetros."""
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    edges = build_edges(notes, fanout, shape, rng)
+
+    attachments_dir = root / "Attachments"
+    attachments_dir.mkdir(exist_ok=True)
+    attachment_names = []
+    for a in range(attachments):
+        name = f"attachment_{a:05d}.{('png', 'jpg', 'pdf')[a % 3]}"
+        (attachments_dir / name).write_bytes(rng.randbytes(attachment_size))
+        attachment_names.append(name)
+    # Cada adjunto se inserta en una nota al azar
+    embeds = [[] for _ in range(notes)]
+    for name in attachment_names:
+        embeds[rng.randrange(notes)].append(name)
+
+    for i in range(notes):
+        folder = root / f"Folder {i // NOTES_PER_FOLDER:03d}"
+        folder.mkdir(exist_ok=True)
+        lines = [f"---\ntitle: {note_name(i)}\n---\n", f"# {note_name(i)}\n"]
+        for j, target in enumerate(edges[i]):
+            text = " ".join(rng.choice(WORDS) for _ in range(30))
+            link = (f"[[{note_name(target)}]]", f"[[{note_name(target)}|alias {j}]]",
+                    f"[[{note_name(target)}#Section]]")[j % 3]
+            lines.append(f"{text} {link}.\n")
+        for k, name in enumerate(embeds[i]):
+            lines.append(f"![[{name}]]\n" if k % 2 == 0 else f"![figure](Attachments/{name})\n")
+        if i % 10 == 0:
+            lines.append("```python\nprint('[[Not A Link]]')\n```\n")
+        (folder / f"{note_name(i)}.md").write_text("\n".join(lines), encoding='utf-8')
+
+    for folder_name in excluded_folders:
+        folder = root / folder_name
+        folder.mkdir(exist_ok=True)
+        for e in range(excluded_notes):
+            (folder / f"Excluded {e:04d}.md").write_text(f"[[{note_name(e % notes)}]]\n", encoding='utf-8')
+
+    return {"notes": notes, "fanout": fanout, "shape": shape, "attachments": attachments,
+            "attachment_size": attachment_size, "excluded_folders": list(excluded_folders),
+            "excluded_notes": excluded_notes, "seed": seed}
+
+
+def start_note_path(root: Path) -> Path:
+    return root / f"Folder {0:03d}" / f"{note_name(0)}.md"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera un vault sintético para benchmarks.")
+    parser.add_argument("destination", type=Path)
+    parser.add_argument("--notes", type=int, default=1000)
+    parser.add_argument("--fanout", type=int, default=5)
+    parser.add_argument("--shape", choices=GRAPH_SHAPES, default="small-world")
+    parser.add_argument("--attachments", type=int, default=100)
+    parser.add_argument("--attachment-size", type=int, default=50_000, help="Bytes por adjunto.")
+    parser.add_argument("--excluded-folders", nargs="*", default=[".obsidian", ".trash"])
+    parser.add_argument("--excluded-notes", type=int, default=20, help="Notas por carpeta excluida.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    summary = generate_vault(args.destination, args.notes, args.fanout, args.shape, args.attachments,
+                             args.attachment_size, tuple(args.excluded_folders), args.excluded_notes, args.seed)
+    print(f"Vault generated at {args.destination}: {summary}")
+
+
+if __name__ == "__main__":
+    main()
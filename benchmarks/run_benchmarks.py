@@ -0,0 +1,183 @@
+"""
+Benchmarks de rendimiento de ExportBuilder y document_converter.
+
+Genera un vault sintético por cada tamaño pedido, mide cada fase por separado y
+guarda los resultados en JSON para poder comparar versiones:
+
+    python benchmarks/run_benchmarks.py --notes 1000 10000 --shape hub --output bench.json
+
+Pandoc se sustituye por un programa que devuelve un AST JSON mínimo al analizar cada
+nota y no genera nada al renderizar, de modo que solo se mide el coste propio del
+conversor (análisis en paralelo, caché de AST, unión de los AST y lanzamiento de procesos).
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from datetime import datetime
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import export_builder  # noqa: E402
+import document_converter  # noqa: E402
+from generate_vault import generate_vault, start_note_path, GRAPH_SHAPES  # noqa: E402
+
+
+def timed(func, *args, **kwargs) -> tuple[float, object]:
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+# `pandoc --version` devuelve una versión ficticia, `--to json` un AST vacío y el resto
+# de llamadas (la generación de cada formato) solo consumen la entrada
+PANDOC_STUB = """import sys
+if "--version" in sys.argv:
+    print("pandoc 0.0-benchmark-stub")
+else:
+    sys.stdin.buffer.read()
+    if "--to" in sys.argv and sys.argv[sys.argv.index("--to") + 1] == "json":
+        print('{"pandoc-api-version": [1, 23, 1], "meta": {}, "blocks": []}')
+"""
+
+
+def install_pandoc_stub(directory: Path):
+    """Pone al principio del PATH un `pandoc` de prueba (ver PANDOC_STUB)."""
+    directory.mkdir(parents=True, exist_ok=True)
+    script = directory / "pandoc_stub.py"
+    script.write_text(PANDOC_STUB)
+    if os.name == "nt":
+        (directory / "pandoc.bat").write_text(f'@"{sys.executable}" "{script}" %*\r\n')
+    else:
+        stub = directory / "pandoc"
+        stub.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n')
+        stub.chmod(0o755)
+    os.environ["PATH"] = str(directory) + os.pathsep + os.environ.get("PATH", "")
+
+
+def bench_export(vault_path: Path, exclude_folders: list, depth: int, work_dir: Path) -> dict:
+    phases = {}
+    export_builder.INDEX_CACHE_DIR = work_dir / "index_cache"
+    builder = export_builder.ExportBuilder(vault_path, work_dir / "exports", exclude_folders, rebuild_index=True)
+
+    phases["build_vault_index_cold"], _ = timed(builder._build_vault_index)
+    builder.rebuild_index = False
+    phases["build_vault_index_cached"], _ = timed(builder._build_vault_index)
+
+    start_note = start_note_path(vault_path)
+    moc_path = builder.notes_dir / "_MOC_Guide.md"
+    with open(moc_path, 'w', encoding='utf-8') as moc_file:
+        moc_file.write(export_builder.MOC_HEADER)
+        phases["explore_and_copy"], _ = timed(builder.explore_and_copy, start_note, depth, moc_file)
+    phases["asset_copy"], _ = timed(builder.asset_stage.close)
+    phases["write_manifest"], _ = timed(builder._write_manifest, start_note, depth)
+    visited = list(builder.visited_notes)
+
+    # _process_assets aislado, sobre el contenido ya leído de las notas exportadas
+    contents = [note_path.read_text(encoding='utf-8') for note_path, _ in visited]
+    phases["process_assets"], _ = timed(
+        lambda: [builder._process_assets(c, links=[], assets=[], targets={}) for c in contents])
+
+    # Generación del MOC: el mismo recorrido, con los enlaces ya en memoria y sin E/S de notas
+    links = {note_path: builder._read_note(note_path).linked_notes for note_path, _ in visited}
+    builder.processed_notes, builder.visited_notes = set(), []
+    with open(moc_path, 'w', encoding='utf-8') as moc_file:
+        moc_file.write(export_builder.MOC_HEADER)
+        phases["moc_generation"], _ = timed(builder.explore_and_copy, start_note, depth, moc_file,
+                                            lambda note_path: links[note_path])
+
+    # document_converter, con pandoc sustituido por el stub
+    export_root = builder.export_root
+    output_dir = export_root / document_converter.OUTPUT_SUBFOLDER_NAME
+    output_dir.mkdir(exist_ok=True)
+    phases["manifest_input_files"], (inputs, _) = timed(document_converter.manifest_input_files, export_root)
+    phases["find_root_note"], root_note = timed(document_converter.find_root_note, export_root)
+    phases["collect_input_files"], _ = timed(document_converter.collect_input_files, export_root, root_note)
+    phases["parse_notes_cold"], _ = timed(document_converter.parse_export, inputs, output_dir)
+    phases["parse_notes_cached"], _ = timed(document_converter.parse_export, inputs, output_dir)
+    phases["convert_export"], results = timed(document_converter.convert_export, inputs, export_root, output_dir,
+                                              ["pdf", "docx"], format_options={})
+    if not all(result["ok"] for result in results.values()):
+        raise RuntimeError(f"Conversion with the pandoc stub failed: {results}")
+
+    counts = {
+        "notes_exported": len(visited),
+        "assets_copied": len(builder.copied_assets),
+        "asset_bytes_copied": builder.asset_stage.bytes_copied,
+        "converter_inputs": len(inputs),
+    }
+    return {"phases": phases, "counts": counts}
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide cada fase de la exportación sobre vaults sintéticos.")
+    parser.add_argument("--notes", type=int, nargs="+", default=[1000], help="Tamaños de vault (1k a 200k).")
+    parser.add_argument("--fanout", type=int, default=5)
+    parser.add_argument("--shape", choices=GRAPH_SHAPES, default="small-world")
+    parser.add_argument("--attachments", type=int, default=100)
+    parser.add_argument("--attachment-size", type=int, default=50_000)
+    parser.add_argument("--excluded-folders", nargs="*", default=[".obsidian", ".trash"])
+    parser.add_argument("--depth", type=int, default=-1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", type=Path, help="Directorio de trabajo (por defecto, uno temporal).")
+    parser.add_argument("--keep", action="store_true", help="No borra los vaults ni las exportaciones.")
+    parser.add_argument("--output", type=Path, default=Path("benchmark_results.json"))
+    parser.add_argument("--verbose", action="store_true", help="Muestra el log de la exportación.")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+    work_root = args.work_dir or Path(tempfile.mkdtemp(prefix="obsidian_bench_"))
+    install_pandoc_stub(work_root / "pandoc_stub")
+
+    runs = []
+    try:
+        for notes in args.notes:
+            run_dir = work_root / f"run_{notes}_{args.shape}"
+            shutil.rmtree(run_dir, ignore_errors=True)
+            vault_path = run_dir / "vault"
+            generate_time, params = timed(
+                generate_vault, vault_path, notes, args.fanout, args.shape, args.attachments,
+                args.attachment_size, tuple(args.excluded_folders), seed=args.seed)
+            params["depth"] = args.depth
+            result = bench_export(vault_path, args.excluded_folders, args.depth, run_dir)
+            runs.append({"params": params, "generate_vault_s": generate_time, **result})
+
+            print(f"\n{notes} notes ({args.shape}, fan-out {args.fanout}, depth {args.depth}):")
+            for phase, seconds in result["phases"].items():
+                print(f"  {phase:<26} {seconds * 1000:>10.1f} ms")
+            print(f"  {result['counts']}")
+    finally:
+        if not args.keep and not args.work_dir:
+            shutil.rmtree(work_root, ignore_errors=True)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "runs": runs,
+    }
+    args.output.write_text(json.dumps(report, indent=2), encoding='utf-8')
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
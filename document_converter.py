@@ -1,13 +1,31 @@
 import sys
 import os
+import json
+import time
+import argparse
 import subprocess
 from pathlib import Path
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import Tk, filedialog, messagebox
 import logging
 
+from run_metrics import RunMetrics
+from export_builder import load_export_manifest
+from pandoc_stage import AstCache, PandocError, AST_CACHE_DIR_NAME, READ_OPTIONS, order_by_moc, merge_asts
+
 # --- CONFIGURACIÓN ---
 DEFAULT_SEARCH_DIR = Path("Ruta alojada las exportaciones")
 OUTPUT_SUBFOLDER_NAME = "_Converted"
+REPORT_FILE_NAME = "conversion_report.json"
+CONFIG_FILE = Path("config.json")
+# Opciones de Pandoc de cada formato; se pueden cambiar en config.json con la clave
+# "output_formats", p. ej. {"pdf": ["--toc", "--pdf-engine=lualatex"], "html": ["--toc"]}
+DEFAULT_FORMAT_OPTIONS = {
+    "pdf": ["--toc", "--number-sections", "--pdf-engine=xelatex"],
+    "docx": ["--toc", "--number-sections"],
+    "epub": ["--toc", "--number-sections"],
+}
 
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s', stream=sys.stdout)
 
@@ -42,74 +60,179 @@ def find_root_note(export_folder: Path) -> Path | None:
         logging.error("No se encontró ningún archivo .md en la carpeta seleccionada.")
     return root_note
 
-def run_pandoc_command(command: list):
-    command_str = [str(c) for c in command]
-    logging.info(f"Ejecutando comando Pandoc: {' '.join(command_str)}")
+def collect_input_files(export_folder: Path, root_note: Path) -> list[Path]:
+    """Devuelve los archivos .md a convertir, empezando por la nota raíz."""
+    logging.info("Recopilando todos los archivos .md para la conversión...")
+    all_md_files = []
+    for md_file in export_folder.rglob('*.md'):
+        if OUTPUT_SUBFOLDER_NAME not in md_file.parts:
+            all_md_files.append(md_file)
+    
+    pandoc_input_files = [root_note]
+    for md_file in all_md_files:
+        if md_file != root_note:
+            pandoc_input_files.append(md_file)
+    return pandoc_input_files
+
+def manifest_input_files(export_folder: Path) -> tuple[list[Path], int] | None:
+    """
+    Devuelve las notas del manifiesto de la exportación en el orden del MOC (la nota
+    raíz primero) y su tamaño total, sin recorrer la carpeta. None si no hay manifiesto.
+    Lanza FileNotFoundError si falta alguna de las notas del manifiesto.
+    """
+    manifest = load_export_manifest(export_folder)
+    if not manifest or not manifest["notes"]:
+        return None
+    notes = manifest["notes"]
+    missing = [e["output"] for e in notes if not (export_folder / e["output"]).is_file()]
+    if missing:
+        others = f" (y {len(missing) - 1} más)" if len(missing) > 1 else ""
+        raise FileNotFoundError(f"No se encuentra la nota {missing[0]} del manifiesto{others}. "
+                                f"Vuelve a exportar o actualiza la exportación.")
+    logging.info(f"Manifiesto encontrado: {len(notes)} notas, nota raíz {Path(notes[0]['output']).name}.")
+    return [export_folder / e["output"] for e in notes], sum(e["size"] for e in notes)
+
+# --- CONVERSIÓN A VARIOS FORMATOS ---
+def load_format_options() -> dict:
+    """Opciones de Pandoc por formato: las predeterminadas, sustituidas por las de `output_formats` en config.json."""
+    format_options = {fmt: list(options) for fmt, options in DEFAULT_FORMAT_OPTIONS.items()}
     try:
-        result = subprocess.run(
-            command_str, check=True, capture_output=True, text=True, encoding='utf-8'
-        )
-        logging.info("Pandoc se ejecutó con éxito.")
-        if result.stderr: logging.info(f"Salida de Pandoc (stderr):\n{result.stderr}")
-        return True
+        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+            format_options.update(json.load(f).get("output_formats", {}))
+    except (OSError, ValueError):
+        pass
+    return format_options
+
+def parse_export(input_files: list[Path], output_dir: Path, metrics: RunMetrics | None = None) -> tuple[dict, list[Path]]:
+    """
+    Analiza la exportación una sola vez: cada nota se convierte a AST (en paralelo y
+    con caché en `_Converted/.ast_cache`) y los AST se unen en el orden del MOC.
+    Devuelve el documento unido y las notas en ese orden.
+    """
+    notes = order_by_moc(input_files)
+    cache = AstCache(output_dir / AST_CACHE_DIR_NAME, READ_OPTIONS, workers=os.cpu_count() or 4, metrics=metrics)
+    with metrics.phase("parse_notes") if metrics is not None else nullcontext():
+        return merge_asts(cache.parse_all(notes)), notes
+
+def render_format(document: str, output_file: Path, options: list, resource_path: str) -> dict:
+    """Genera `output_file` a partir del documento unido (AST JSON). No muestra diálogos."""
+    command = ["pandoc", "-o", str(output_file), "--from", "json", "--resource-path", resource_path,
+               "--standalone", *options]
+    logging.info(f"Ejecutando comando Pandoc: {' '.join(command)}")
+    started = time.perf_counter()
+    error = None
+    try:
+        result = subprocess.run(command, check=True, capture_output=True, text=True, encoding='utf-8', input=document)
+        if result.stderr: logging.info(f"Salida de Pandoc (stderr) para {output_file.name}:\n{result.stderr}")
     except FileNotFoundError:
-        messagebox.showerror("Error", "No se pudo encontrar 'pandoc'. Asegúrate de que está instalado y en el PATH.")
-        return False
+        error = "No se pudo encontrar 'pandoc'. Asegúrate de que está instalado y en el PATH."
     except subprocess.CalledProcessError as e:
-        messagebox.showerror("Error de Pandoc", f"Pandoc falló:\n\n{e.stderr}")
-        return False
-    except Exception as e:
-        messagebox.showerror("Error Inesperado", f"Ocurrió un error:\n\n{e}")
-        return False
-
-# --- FUNCIÓN DE CONVERSIÓN A PDF ---
-def convert_to_pdf(input_files: list[Path], export_folder: Path, output_dir: Path):
-    """Genera un archivo PDF profesional aprovechando los metadatos YAML."""
-    output_file = output_dir / f"{export_folder.name}.pdf"
-    command = [
-        "pandoc",
-        *input_files,
-        "-o", output_file,
-        "--from", "markdown+yaml_metadata_block", # Leer metadatos YAML
-        "--resource-path", str(export_folder),
-        "--standalone",
-        "--toc", # Tabla de Contenidos
-        "--number-sections", # Numerar secciones
-        "--pdf-engine=xelatex",
-    ]
-    if run_pandoc_command(command):
-        messagebox.showinfo("Éxito", f"PDF generado con éxito en:\n{output_file}")
+        error = e.stderr or f"Pandoc terminó con código {e.returncode}."
+    elapsed = time.perf_counter() - started
+    return {"output": str(output_file), "ok": error is None, "wall_s": elapsed, "error": error}
+
+def convert_export(input_files: list[Path], export_folder: Path, output_dir: Path, formats: list[str],
+                   format_options: dict | None = None, jobs: int | None = None,
+                   metrics: RunMetrics | None = None) -> dict:
+    """
+    Convierte la exportación a todos los `formats` analizándola una sola vez. Los
+    formatos se generan a la vez, con como mucho `jobs` procesos de Pandoc.
+    Devuelve el resultado de cada formato; los errores de análisis se propagan.
+    """
+    format_options = format_options or load_format_options()
+    merged, notes = parse_export(input_files, output_dir, metrics)
+    document = json.dumps(merged)
+    # Las imágenes de las notas usan rutas relativas a Notes/ (../Assets/...)
+    resource_path = os.pathsep.join([*map(str, dict.fromkeys(f.parent for f in notes)), str(export_folder)])
+
+    def render(fmt: str) -> dict:
+        output_file = output_dir / f"{export_folder.name}.{fmt}"
+        result = render_format(document, output_file, format_options.get(fmt, []), resource_path)
+        logging.info(f"Formato {fmt}: {'generado' if result['ok'] else 'fallido'} en {result['wall_s']:.1f} s.")
+        if metrics is not None:
+            metrics.add_time(f"render_{fmt}", result["wall_s"])
+        return result
+
+    with ThreadPoolExecutor(max_workers=jobs or len(formats)) as pool:
+        results = dict(zip(formats, pool.map(render, formats)))
+    if metrics is not None:
+        metrics.details["formats"] = results
+    return results
+
+def show_conversion_results(results: dict):
+    succeeded = [f"{fmt.upper()}: {r['output']}" for fmt, r in results.items() if r["ok"]]
+    failed = [f"{fmt.upper()}:\n{r['error']}" for fmt, r in results.items() if not r["ok"]]
+    if failed:
+        messagebox.showwarning("Fallo", "No se pudieron generar algunos formatos:\n\n" + "\n\n".join(failed)
+                               + ("\n\nGenerados:\n" + "\n".join(succeeded) if succeeded else ""))
     else:
-        messagebox.showwarning("Fallo", "No se pudo generar el PDF. Revisa la consola para ver los errores de Pandoc.")
+        messagebox.showinfo("Éxito", "Documentos generados con éxito en:\n" + "\n".join(succeeded))
+
+def parse_args(format_options: dict) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Convierte un paquete de exportación a PDF, DOCX o EPUB con Pandoc.")
+    parser.add_argument("export_folder", nargs="?", type=Path,
+                        help="Carpeta de exportación (si se omite, se elige en un diálogo).")
+    parser.add_argument("--formats", nargs="+", choices=sorted(format_options), default=["pdf"], metavar="FORMAT",
+                        help=f"Formatos de salida: {', '.join(sorted(format_options))} (por defecto, pdf).")
+    parser.add_argument("--jobs", type=int, metavar="N",
+                        help="Máximo de formatos generados a la vez (por defecto, todos).")
+    args = parser.parse_args()
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    args.formats = list(dict.fromkeys(args.formats))
+    return args
 
 # --- FUNCIÓN PRINCIPAL ---
 def main():
-    export_folder = select_export_folder()
+    format_options = load_format_options()
+    args = parse_args(format_options)
+    export_folder = args.export_folder or select_export_folder()
     if not export_folder: return
 
     output_dir = export_folder / OUTPUT_SUBFOLDER_NAME
     output_dir.mkdir(exist_ok=True)
     logging.info(f"Los archivos convertidos se guardarán en: {output_dir}")
 
-    root_note = find_root_note(export_folder)
-    if not root_note:
-        messagebox.showerror("Error", f"No se pudo encontrar una nota .md raíz en la carpeta:\n{export_folder}")
-        return
+    metrics = RunMetrics()
+    with metrics.phase("load_manifest"):
+        try:
+            from_manifest = manifest_input_files(export_folder)
+        except FileNotFoundError as e:
+            messagebox.showerror("Error", str(e))
+            return
+    if from_manifest:
+        pandoc_input_files, input_bytes = from_manifest
+    else:
+        # Exportaciones sin manifiesto (o de versiones anteriores): se recorre la carpeta
+        logging.warning("No se encontró un manifiesto válido; se buscarán las notas en la carpeta.")
+        with metrics.phase("find_root_note"):
+            root_note = find_root_note(export_folder)
+        if not root_note:
+            messagebox.showerror("Error", f"No se pudo encontrar una nota .md raíz en la carpeta:\n{export_folder}")
+            return
 
-    logging.info("Recopilando todos los archivos .md para la conversión...")
-    all_md_files = []
-    for md_file in export_folder.rglob('*.md'):
-        if OUTPUT_SUBFOLDER_NAME not in md_file.parts:
-            all_md_files.append(md_file)
-    
-    pandoc_input_files = [root_note]
-    for md_file in all_md_files:
-        if md_file != root_note:
-            pandoc_input_files.append(md_file)
-    
-    logging.info(f"Se procesarán {len(pandoc_input_files)} archivos para la conversión a PDF.")
+        with metrics.phase("collect_inputs"):
+            pandoc_input_files = collect_input_files(export_folder, root_note)
+        input_bytes = sum(f.stat().st_size for f in pandoc_input_files)
+    metrics.count("input_files", len(pandoc_input_files))
+    metrics.count("input_bytes", input_bytes)
+    logging.info(f"Se procesarán {len(pandoc_input_files)} archivos para la conversión a: {', '.join(args.formats)}.")
 
-    convert_to_pdf(pandoc_input_files, export_folder, output_dir)
+    try:
+        with metrics.phase("convert"):
+            results = convert_export(pandoc_input_files, export_folder, output_dir, args.formats, format_options,
+                                     args.jobs, metrics)
+    except (FileNotFoundError, subprocess.CalledProcessError) as e:
+        if isinstance(e, FileNotFoundError) and e.filename != "pandoc":
+            messagebox.showerror("Error", f"No se pudo leer '{e.filename}':\n\n{e}")
+        else:
+            messagebox.showerror("Error", "No se pudo encontrar 'pandoc'. Asegúrate de que está instalado y en el PATH.")
+        return
+    except (PandocError, ValueError) as e:
+        messagebox.showerror("Error de Pandoc", f"{e}\n\n{getattr(e, 'stderr', '')}")
+        return
+    metrics.write_report(export_folder / REPORT_FILE_NAME, export_folder=str(export_folder), formats=args.formats)
+    show_conversion_results(results)
     
     logging.info("Proceso de conversión finalizado.")
 
@@ -1,130 +1,582 @@
+import io
 import sys
-import re
 import shutil
-import os
 from pathlib import Path
 from datetime import datetime
 import logging
-from urllib.parse import unquote
 import json
+import time
+import argparse
+import threading
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from vault_index import load_vault_index, resolve_target, find_owning_vault, MultiVaultIndex, VaultIndex
+from asset_stage import AssetStage, COPY_STRATEGIES, file_hash
+from image_stage import ImageStage, image_settings_from_config
+from link_tokenizer import rewrite_links
+from run_metrics import RunMetrics, PROFILE_MODES
+from archive_output import ArchiveWriter, ARCHIVE_FORMATS, ARCHIVE_EXTENSIONS, DEFAULT_COMPRESSION_LEVEL
 
 # --- Configuración del Logging ---
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s', stream=sys.stdout)
 
-# --- Constantes y Patrones de Regex ---
+# --- Constantes ---
 CONFIG_FILE = Path("config.json")
+INDEX_CACHE_DIR = CONFIG_FILE.with_name(".vault_index_cache")
+IMAGE_CACHE_DIR = CONFIG_FILE.with_name(".image_cache")
 ATTACHMENT_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.svg', '.pdf'}
-LINK_PATTERN = re.compile(r'(!?)\[\[([^|#\]]+)(?:\|([^\]]+))?\]\]')
-MD_IMAGE_PATTERN = re.compile(r'!\[(.*?)\]\((.*?)\)')
+MANIFEST_FILE_NAME = "export_manifest.json"
+MANIFEST_VERSION = 3
+REPORT_FILE_NAME = "export_report.json"
+MOC_FILE_NAME = "_MOC_Guide.md"
+MOC_HEADER = "# Export Manuscript\n\nThis file lists the notes included in this export, in hierarchical order.\n\n"
+
+class NoteData(NamedTuple):
+    """Resultado de leer una nota: contenido a escribir (None si no hay que escribirlo),
+    notas enlazadas, adjuntos y su entrada para el manifiesto (None si no se pudo leer)."""
+    content: str | None
+    linked_notes: list
+    assets: list
+    entry: dict | None
+
+def load_export_manifest(export_root: Path) -> dict | None:
+    manifest_path = export_root / MANIFEST_FILE_NAME
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
 
 class ExportBuilder:
     """
     Construye un paquete de exportación autocontenido a partir de una nota de inicio
     en un vault de Obsidian, explorando hasta una profundidad especificada.
+    Con `update_dir` se actualiza una exportación existente: solo se reescriben las
+    notas y adjuntos que han cambiado y se borran las salidas que ya no se alcanzan.
+    `vault_index` permite reutilizar un índice ya construido y `export_name` fija el
+    nombre de la carpeta de exportación en lugar del nombre con fecha y hora.
+    `fallback_vaults` ({vault: índice}, en orden) permite resolver en otros vaults los
+    enlaces que no existen en el vault de la nota de inicio.
+    Con `archive_format` ("zip" o "tar.gz") la exportación se escribe directamente en
+    un archivo comprimido en lugar de en una carpeta; no admite el modo actualización.
+    Con `image_stage` (un ImageStage) las imágenes se optimizan antes de copiarlas; la
+    etapa es de quien la crea, que debe cerrarla.
     """
-    def __init__(self, vault_path: Path, export_base_dir: Path, exclude_folders: list):
+    # Con False no se escribe en el log una línea por nota visitada (modo vigilancia)
+    log_notes = True
+
+    def __init__(self, vault_path: Path, export_base_dir: Path, exclude_folders: list, rebuild_index: bool = False,
+                 workers: int = 1, update_dir: Path | None = None, asset_strategy: str = "copy",
+                 asset_workers: int = 4, profile: str | None = None, vault_index: VaultIndex | None = None,
+                 export_name: str | None = None, archive_format: str | None = None,
+                 compression_level: int = DEFAULT_COMPRESSION_LEVEL, fallback_vaults: dict | None = None,
+                 image_stage: ImageStage | None = None):
+        if archive_format and update_dir:
+            raise ValueError("Update mode is only available for directory exports.")
         self.vault_path = vault_path
         self.export_base_dir = export_base_dir
         self.exclude_folders = exclude_folders
-        self.export_root = self._create_export_root()
+        self.rebuild_index = rebuild_index
+        self.workers = workers
+        self.update_dir = update_dir
+        self.profile = profile
+        self.export_name = export_name
+        self.fallback_vaults = fallback_vaults or {}
+        self.asset_strategy = asset_strategy
+        self.asset_workers = asset_workers
+        self.image_stage = image_stage
+        self.metrics = RunMetrics()
+        self.archive = None
+        if archive_format:
+            # export_root es el propio archivo; Notes/ y Assets/ son rutas dentro de él
+            self.export_root = self._export_path(ARCHIVE_EXTENSIONS[archive_format])
+            self.export_base_dir.mkdir(parents=True, exist_ok=True)
+            self.archive = ArchiveWriter(self.export_root, archive_format, compression_level)
+            logging.info(f"Export archive: {self.export_root}")
+        else:
+            self.export_root = self._create_export_root()
         self.notes_dir = self.export_root / "Notes"
         self.assets_dir = self.export_root / "Assets"
-        self.notes_dir.mkdir()
-        self.assets_dir.mkdir()
-        self.vault_index = self._build_vault_index()
+        if not self.archive:
+            self.notes_dir.mkdir(exist_ok=update_dir is not None)
+            self.assets_dir.mkdir(exist_ok=update_dir is not None)
+        self.vault_index = vault_index if vault_index is not None else self._build_vault_index()
         self.processed_notes = set()
         self.copied_assets = set()
-        self.moc_content = "# Export Manuscript\n\nThis file lists the notes included in this export, in hierarchical order.\n\n"
+        self.visited_notes = []
+        self.note_parents = {}
+        self._lock = threading.Lock()
+
+        # Entradas del manifiesto anterior (modo actualización) y del actual
+        previous = load_export_manifest(self.export_root) if update_dir else None
+        self._previous_notes = {e["source"]: e for e in previous["notes"]} if previous else {}
+        self._previous_assets = {e["source"]: e for e in previous["assets"]} if previous else {}
+        self._note_entries = {}
+        self._manifest_fragments = {}
+        self._asset_extensions = {}
+        self.asset_stage = AssetStage(self.assets_dir, asset_strategy, asset_workers, self._previous_assets,
+                                      self.metrics, self.archive, image_stage)
 
     def _create_export_root(self) -> Path:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        dest_dir = self.export_base_dir / f"Export_{self.vault_path.name}_{timestamp}"
+        if self.update_dir:
+            if not self.update_dir.is_dir():
+                raise FileNotFoundError(f"Export folder to update not found: {self.update_dir}")
+            logging.info(f"Updating existing export at: {self.update_dir}")
+            return self.update_dir
+        dest_dir = self._export_path()
+        if self.export_name and load_export_manifest(dest_dir) is not None:
+            raise FileExistsError(f"{dest_dir} already contains an export; use update mode to refresh it.")
+        if self.export_name:
+            # Con nombre fijo la carpeta puede contener una exportación interrumpida
+            # (sin manifiesto, así que no se puede actualizar): se empieza de cero
+            for leftover in (dest_dir / "Notes", dest_dir / "Assets"):
+                if leftover.is_dir():
+                    logging.warning(f"Removing leftovers of an unfinished export: {leftover}")
+                    shutil.rmtree(leftover)
         dest_dir.mkdir(parents=True, exist_ok=True)
         logging.info(f"Export folder created at: {dest_dir}")
         return dest_dir
 
-    def _build_vault_index(self) -> dict:
+    def _export_path(self, extension: str = "") -> Path:
+        if self.export_name:
+            return self.export_base_dir / f"{self.export_name}{extension}"
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return self.export_base_dir / f"Export_{self.vault_path.name}_{timestamp}{extension}"
+
+    def _write_output(self, relative_path: str, text: str):
+        """Escribe un archivo de texto de la exportación (en la carpeta o en el archivo comprimido)."""
+        if self.archive:
+            self.archive.write_text(relative_path, text)
+        else:
+            (self.export_root / relative_path).write_text(text, encoding='utf-8')
+
+    def _build_vault_index(self) -> VaultIndex:
         logging.info(f"Building index for vault: {self.vault_path}...")
-        index = {}
-        for root, dirs, files in os.walk(self.vault_path):
-             dirs[:] = [d for d in dirs if d not in self.exclude_folders]
-             for file in files:
-                full_path = Path(root) / file
-                index[full_path.stem.lower()] = full_path
-                index[full_path.name.lower()] = full_path
-        logging.info(f"Index built with {len(index)} entries.")
+        with self.metrics.phase("index"):
+            index = load_vault_index(self.vault_path, self.exclude_folders, INDEX_CACHE_DIR,
+                                     rebuild=self.rebuild_index)
+        logging.info(f"Index built with {len(index)} files.")
         return index
     
+    @property
+    def vault_index(self) -> VaultIndex:
+        return self._vault_index
+
+    @vault_index.setter
+    def vault_index(self, index: VaultIndex):
+        # Un índice nuevo invalida los enlaces ya resueltos
+        self._vault_index = index
+        self._resolved = {}
+
     def find_file_in_vault(self, target: str) -> Path | None:
-        clean_target = unquote(target.strip()).lower()
-        path = self.vault_index.get(clean_target)
-        if path: return path
-        path = self.vault_index.get(Path(clean_target).stem)
-        return path
-
-    def run(self, start_note_path: Path, max_depth: int):
-        self.explore_and_copy(start_note_path, 0, max_depth)
-        
-        # Generar el MOC final con enlaces funcionales
-        final_moc_content = ""
-        for line in self.moc_content.splitlines():
-            match = re.search(r'\[\[(.*?)\]\]', line)
-            if match:
-                note_stem = match.group(1)
-                line = line.replace(f"[[{note_stem}]]", f"[{note_stem}](./{note_stem}.md)")
-            final_moc_content += line + "\n"
-
-        moc_path = self.notes_dir / "_MOC_Guide.md"
-        moc_path.write_text(final_moc_content, encoding='utf-8')
-        logging.info(f"MOC Guide generated at: {moc_path}")
-
-    def explore_and_copy(self, note_path: Path, current_depth: int, max_depth: int):
-        if (max_depth != -1 and current_depth > max_depth) or note_path in self.processed_notes:
+        """Resuelve un enlace en el vault y, si no existe, en `fallback_vaults`. Se memoriza por destino."""
+        if target not in self._resolved:
+            path = resolve_target(self.vault_index, target)
+            if path is None:
+                for index in self.fallback_vaults.values():
+                    path = resolve_target(index, target)
+                    if path is not None:
+                        break
+            self._resolved[target] = path
+        return self._resolved[target]
+
+    def reset_for_update(self):
+        """
+        Prepara el builder para volver a ejecutar `run` sobre la misma exportación en
+        modo actualización, con el resultado de la última pasada como manifiesto anterior.
+        """
+        if self.archive:
+            raise ValueError("Update mode is only available for directory exports.")
+        self.update_dir = self.export_root
+        self._previous_notes = {e["source"]: e for e in self._note_entries.values()}
+        self._previous_assets = {e["source"]: e for e in self.asset_stage.entries.values()}
+        self._note_entries = {}
+        self.processed_notes, self.copied_assets = set(), set()
+        self.visited_notes, self.note_parents = [], {}
+        self.metrics = RunMetrics()
+        self.asset_stage = AssetStage(self.assets_dir, self.asset_strategy, self.asset_workers,
+                                      self._previous_assets, self.metrics, image_stage=self.image_stage)
+
+    def prepare_rewrite(self):
+        """
+        Toma el resultado de la última pasada como manifiesto anterior antes de volver a
+        leer notas para `rewrite_notes`: `_read_note` compara con él para decidir si hay
+        que escribir cada nota.
+        """
+        if self.archive:
+            raise ValueError("Update mode is only available for directory exports.")
+        self._previous_notes = {e["source"]: e for e in self._note_entries.values()}
+        self._previous_assets = {e["source"]: e for e in self.asset_stage.entries.values()}
+        self.metrics = RunMetrics()
+
+    def rewrite_notes(self, start_note_path: Path, max_depth: int, notes: dict):
+        """
+        Vuelve a escribir solo `notes` ({ruta: NoteData}, leídas tras `prepare_rewrite`) y
+        el manifiesto, sin repetir el recorrido. Solo es válido tras un `run` y si esas
+        notas ya estaban exportadas con los mismos enlaces y adjuntos: el MOC y el
+        conjunto de notas no cambian.
+        """
+        with self.metrics.capture(self.profile, self.export_root, "export_profile"):
+            with self.metrics.phase("explore"):
+                for note_path, note in notes.items():
+                    self._write_note(note_path, note)
+            with self.metrics.phase("manifest"):
+                self._write_manifest(start_note_path, max_depth)
+        self._write_report(start_note_path, max_depth)
+
+    def run(self, start_note_path: Path, max_depth: int, visit=None):
+        """
+        Ejecuta la exportación. `visit` sustituye a la lectura y escritura de cada nota
+        (ver `explore_and_copy`) y fuerza el recorrido secuencial.
+        """
+        if not self.archive:
+            self._run(start_note_path, max_depth, visit)
             return
-        
-        logging.info(f"{'  ' * current_depth}📖 Processing (Level {current_depth}): {note_path.name}")
-        self.processed_notes.add(note_path)
+        try:
+            self._run(start_note_path, max_depth, visit)
+        except BaseException:
+            self.asset_stage.close()
+            self.archive.abort()
+            raise
+        self.archive.close()
+        logging.info(f"Export archive written to: {self.export_root}")
+
+    def _run(self, start_note_path: Path, max_depth: int, visit=None):
+        if self.archive:
+            profile_dir, profile_name = self.export_base_dir, f"{self.export_root.name}.profile"
+        else:
+            profile_dir, profile_name = self.export_root, "export_profile"
+        with self.metrics.capture(self.profile, profile_dir, profile_name):
+            # El MOC se escribe línea a línea durante el recorrido, ya con enlaces funcionales.
+            # En un archivo comprimido no se puede tener una entrada abierta mientras se
+            # añaden otras, así que se acumula en memoria (una línea por nota) y se escribe al final.
+            moc_path = self.notes_dir / MOC_FILE_NAME
+            moc_file = io.StringIO() if self.archive else open(moc_path, 'w', encoding='utf-8')
+            with moc_file, self.metrics.phase("explore"):
+                moc_file.write(MOC_HEADER)
+                if self.workers > 1 and visit is None:
+                    self._explore_parallel(start_note_path, max_depth, moc_file)
+                else:
+                    self.explore_and_copy(start_note_path, max_depth, moc_file, visit)
+                if self.archive:
+                    self.archive.write_text(f"{self.notes_dir.name}/{MOC_FILE_NAME}", moc_file.getvalue())
+            logging.info(f"MOC Guide generated at: {moc_path}")
+            with self.metrics.phase("asset_wait"):
+                self.asset_stage.close()
+            stage = self.asset_stage
+            logging.info(f"Assets: {stage.files_copied} copied ({stage.bytes_copied / 1e6:.1f} MB), "
+                         f"{stage.files_avoided} linked/reused ({stage.bytes_avoided / 1e6:.1f} MB avoided).")
+            with self.metrics.phase("manifest"):
+                self._write_manifest(start_note_path, max_depth)
+        self._write_report(start_note_path, max_depth)
+
+    def _write_report(self, start_note_path: Path, max_depth: int):
+        """Guarda en la carpeta de exportación el informe JSON con las métricas de la ejecución."""
+        self.metrics.count("notes_visited", len(self.visited_notes))
+        report = self.metrics.report_json(start_note=str(start_note_path), max_depth=max_depth,
+                                          workers=self.workers, update=self.update_dir is not None,
+                                          archive=self.archive.archive_format if self.archive else None)
+        self._write_output(REPORT_FILE_NAME, report)
+        logging.info(f"Metrics report written to: {self.export_root / REPORT_FILE_NAME}")
+
+    def _write_manifest(self, start_note_path: Path, max_depth: int):
+        """
+        Guarda el manifiesto de la exportación y, en modo actualización, borra las
+        salidas que ya no se alcanzan. Las notas aparecen en el orden del MOC, con su
+        nivel, la nota desde la que se alcanzaron (`parent`), su mtime, tamaño y hash;
+        los adjuntos, con su mtime, tamaño y hash. document_converter lo usa para
+        obtener la lista ordenada de notas sin recorrer la carpeta de exportación.
+        """
+        # Cada nota se serializa por separado y el texto se guarda mientras la entrada (el
+        # mismo objeto), el nivel y el padre no cambien: al repetir la exportación con el
+        # mismo builder (modo vigilancia) solo se serializan de nuevo las notas modificadas.
+        notes, note_fragments = [], []
+        fragments, self._manifest_fragments = self._manifest_fragments, {}
+        for note_path, depth in self.visited_notes:
+            if note_path in self._note_entries:
+                entry = self._note_entries[note_path]
+                parent = self.note_parents.get(note_path)
+                cached = fragments.get(note_path)
+                if cached and cached[0] is entry and cached[1] == (depth, parent):
+                    text = cached[2]
+                else:
+                    text = json.dumps({**entry, "depth": depth, "parent": str(parent) if parent else None})
+                self._manifest_fragments[note_path] = (entry, (depth, parent), text)
+                notes.append(entry)
+                note_fragments.append(text)
+        assets = list(self.asset_stage.entries.values())
+
+        stale_outputs = {e["output"] for e in self._previous_notes.values()}
+        stale_outputs |= {e["output"] for e in self._previous_assets.values()}
+        stale_outputs -= {e["output"] for e in notes}
+        stale_outputs -= {e["output"] for e in assets}
+        for output in sorted(stale_outputs):
+            (self.export_root / output).unlink(missing_ok=True)
+            self.metrics.count("outputs_removed")
+            logging.info(f"🗑️ Removed unreachable output: {output}")
+
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "vault_path": str(self.vault_path),
+            "fallback_vaults": [str(vault) for vault in self.fallback_vaults],
+            "start_note": str(start_note_path),
+            "max_depth": max_depth,
+            "moc": f"{self.notes_dir.name}/{MOC_FILE_NAME}",
+            "notes": None,
+            "assets": assets,
+        }
+        head, tail = json.dumps(manifest).split('"notes": null', 1)
+        self._write_output(MANIFEST_FILE_NAME, f'{head}"notes": [{", ".join(note_fragments)}]{tail}')
+
+    def explore_and_copy(self, start_note_path: Path, max_depth: int, moc_file, visit=None):
+        """
+        Recorre la red de notas en profundidad (preorden) con una pila explícita,
+        sin recursión. La primera visita de una nota fija su nivel y su posición
+        en el MOC; las visitas posteriores se ignoran.
+        `visit(note_path)` procesa cada nota y devuelve sus notas enlazadas
+        (por defecto, `_copy_note`).
+        """
+        visit = visit or self._copy_note
+        stack = [(start_note_path, 0, None)]
+        while stack:
+            note_path, current_depth, parent_path = stack.pop()
+            if (max_depth != -1 and current_depth > max_depth) or note_path in self.processed_notes:
+                continue
+
+            if self.log_notes:
+                logging.info(f"{'  ' * current_depth}📖 Processing (Level {current_depth}): {note_path.name}")
+            self.processed_notes.add(note_path)
+            self.visited_notes.append((note_path, current_depth))
+            self.note_parents[note_path] = parent_path
+
+            indent = "    " * current_depth
+            moc_file.write(f"{indent}- [{note_path.stem}](./{note_path.stem}.md)\n")
+
+            linked_notes = visit(note_path)
+            if max_depth != -1 and current_depth >= max_depth:
+                continue
+            # Se apilan en orden inverso para visitar los enlaces en el orden del texto
+            for linked_note_path in reversed(linked_notes):
+                stack.append((linked_note_path, current_depth + 1, note_path))
+
+    def _explore_parallel(self, start_note_path: Path, max_depth: int, moc_file):
+        """
+        Modo por niveles con un pool de hilos:
+        1. Cada frontera de profundidad se lee y se reescribe en paralelo.
+        2. Con los enlaces ya en memoria se repite el recorrido en profundidad de
+           `explore_and_copy`, por lo que el MOC y el conjunto de notas coinciden
+           exactamente con el modo secuencial.
+        3. Las notas seleccionadas se escriben (y sus adjuntos se copian) en paralelo.
+        """
+        notes = {}
+        frontier = [start_note_path]
+        queued = {start_note_path}
+        depth = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while frontier:
+                next_frontier = []
+                for note_path, result in zip(frontier, pool.map(self._read_note, frontier)):
+                    notes[note_path] = result
+                    if max_depth != -1 and depth >= max_depth:
+                        continue
+                    for linked_note_path in result.linked_notes:
+                        if linked_note_path not in queued:
+                            queued.add(linked_note_path)
+                            next_frontier.append(linked_note_path)
+                frontier = next_frontier
+                depth += 1
+
+            selected = []
+            def visit(note_path: Path) -> list[Path]:
+                selected.append(note_path)
+                return notes[note_path].linked_notes
+            self.explore_and_copy(start_note_path, max_depth, moc_file, visit)
+
+            list(pool.map(lambda note_path: self._write_note(note_path, notes[note_path]), selected))
+
+    def _copy_note(self, note_path: Path) -> list[Path]:
+        """Lee, reescribe y guarda una nota; devuelve sus notas .md enlazadas."""
+        note = self._read_note(note_path)
+        self._write_note(note_path, note)
+        return note.linked_notes
+
+    def _read_note(self, note_path: Path) -> NoteData:
+        """
+        Lee la nota una sola vez y devuelve su contenido con las rutas de adjuntos
+        reescritas, las notas .md enlazadas (en el orden en que aparecen) y los
+        adjuntos que hay que copiar. No escribe nada en disco.
+        En modo actualización no se lee la nota si su mtime y tamaño coinciden con
+        el manifiesto y todos sus enlaces se siguen resolviendo igual.
+        """
+        try:
+            stat = note_path.stat()
+        except OSError as e:
+            logging.error(f"Could not read {note_path}: {e}")
+            self.metrics.count("notes_failed"); return NoteData(None, [], [], None)
+
+        previous = self._previous_notes.get(str(note_path))
+        if (previous and previous["mtime_ns"] == stat.st_mtime_ns and previous["size"] == stat.st_size
+                and self._targets_unchanged(previous)
+                and (self.export_root / previous["output"]).exists()):
+            return self._unchanged_note(previous)
 
-        indent = "    " * current_depth
-        self.moc_content += f"{indent}- [[{note_path.stem}]]\n"
-        
         try:
-            content = note_path.read_text(encoding='utf-8')
+            with self.metrics.phase("read"):
+                content = note_path.read_text(encoding='utf-8')
         except Exception as e:
-            logging.error(f"Could not read {note_path}: {e}"); return
-
-        content = self._process_assets(content, LINK_PATTERN)
-        content = self._process_assets(content, MD_IMAGE_PATTERN, is_md_link=True)
-
-        destination_note_path = self.notes_dir / note_path.name
-        destination_note_path.write_text(content, encoding='utf-8')
-        
-        original_content = note_path.read_text(encoding='utf-8')
-        for match in LINK_PATTERN.finditer(original_content):
-            is_embed, target, _ = match.groups()
-            if not is_embed:
+            logging.error(f"Could not read {note_path}: {e}")
+            self.metrics.count("notes_failed"); return NoteData(None, [], [], None)
+        self.metrics.count("bytes_read", stat.st_size)
+
+        with self.metrics.phase("rewrite"):
+            content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+            link_targets, assets, targets = [], [], {}
+            content = self._process_assets(content, links=link_targets, assets=assets, targets=targets)
+
+            linked_notes = []
+            for target in link_targets:
                 linked_note_path = self.find_file_in_vault(target)
+                targets[target] = str(linked_note_path) if linked_note_path else None
                 if linked_note_path and linked_note_path.suffix.lower() == '.md':
-                    self.explore_and_copy(linked_note_path, current_depth + 1, max_depth)
+                    linked_notes.append(linked_note_path)
+
+        entry = {
+            "source": str(note_path),
+            "output": f"Notes/{note_path.name}",
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": content_hash,
+            "links": list(dict.fromkeys(link_targets)),
+            "assets": {str(a): self._asset_output_name(a) for a in assets},
+            "targets": targets,
+        }
+        # Mismo texto y mismos enlaces resueltos: la salida existente sigue siendo válida
+        if (previous and previous["hash"] == content_hash and previous["targets"] == targets
+                and previous["assets"] == entry["assets"] and (self.export_root / previous["output"]).exists()):
+            content = None
+        return NoteData(content, linked_notes, assets, entry)
+
+    def _targets_unchanged(self, entry: dict) -> bool:
+        """Comprueba que los enlaces y los nombres de adjuntos de la nota se resuelven igual que antes."""
+        for target, resolved in entry["targets"].items():
+            path = self.find_file_in_vault(target)
+            if (str(path) if path else None) != resolved:
+                return False
+        return all(self._asset_output_name(Path(source)) == name for source, name in entry["assets"].items())
 
-    def _process_assets(self, content: str, pattern: re.Pattern, is_md_link:bool=False) -> str:
-        def asset_replacer(match):
-            if is_md_link:
-                alias, target = match.groups()
+    def _unchanged_note(self, entry: dict) -> NoteData:
+        targets = entry["targets"]
+        linked_notes = [Path(targets[t]) for t in entry["links"]
+                        if targets[t] and Path(targets[t]).suffix.lower() == '.md']
+        assets = [Path(a) for a in entry["assets"]]
+        return NoteData(None, linked_notes, assets, entry)
+
+    def _write_note(self, note_path: Path, note: NoteData):
+        for asset_path in note.assets:
+            self._copy_asset(asset_path)
+        if note.entry is not None:
+            with self._lock:
+                self._note_entries[note_path] = note.entry
+            for target, resolved in note.entry["targets"].items():
+                if resolved is None and "://" not in target:
+                    self.metrics.append("unresolved_links", {"note": str(note_path), "target": target})
+        if note.content is None:
+            self.metrics.count("notes_unchanged")
+            return
+        with self.metrics.phase("write"):
+            self._write_output(f"{self.notes_dir.name}/{note_path.name}", note.content)
+        self.metrics.count("notes_written")
+        self.metrics.count("bytes_written", len(note.content.encode('utf-8')))
+
+    def _copy_asset(self, asset_path: Path):
+        # El adjunto se reserva bajo el lock para encolarlo una sola vez
+        with self._lock:
+            if asset_path in self.copied_assets:
+                return
+            self.copied_assets.add(asset_path)
+        self.asset_stage.submit(asset_path, self._asset_output_name(asset_path))
+
+    def _asset_output_name(self, asset_path: Path) -> str:
+        """
+        Nombre del adjunto dentro de Assets/. Conserva el nombre original si es el
+        archivo al que el índice resuelve ese nombre; si otro archivo del vault se
+        llama igual, se añade un sufijo derivado de su ruta relativa. El nombre no
+        depende del orden de procesamiento. Si la optimización de imágenes cambia el
+        formato, se usa la nueva extensión.
+        """
+        extension = self._asset_extension(asset_path)
+        name = f"{asset_path.stem}{extension}"
+        if self.find_file_in_vault(asset_path.name) == asset_path:
+            # Con otra extensión, el nombre nuevo no puede ser el de otro archivo del vault
+            other = self.find_file_in_vault(name) if name != asset_path.name else None
+            if other is None or other == asset_path or other.name.lower() != name.lower():
+                return name
+        try:
+            rel_path = asset_path.relative_to(self.vault_path).as_posix()
+        except ValueError:
+            rel_path = asset_path.as_posix()
+        suffix = hashlib.sha1(rel_path.encode('utf-8')).hexdigest()[:8]
+        return f"{asset_path.stem}_{suffix}{extension}"
+
+    def _asset_extension(self, asset_path: Path) -> str:
+        """
+        Extensión del adjunto en Assets/. Si la optimización cambia el formato, la imagen
+        se convierte ahora, antes de escribir el enlace en la nota: si la conversión falla
+        se conserva la extensión original y el adjunto se copia sin cambios.
+        """
+        if not self.image_stage:
+            return asset_path.suffix
+        extension = self.image_stage.output_suffix(asset_path)
+        if self.image_stage.same_format(asset_path.suffix, extension):
+            return extension
+        try:
+            stat = asset_path.stat()
+        except OSError:
+            return asset_path.suffix
+        key = (asset_path, stat.st_mtime_ns, stat.st_size)
+        if key not in self._asset_extensions:
+            # El hash del manifiesto anterior evita releer las imágenes que no han cambiado
+            previous = self._previous_assets.get(str(asset_path))
+            if previous and previous["mtime_ns"] == stat.st_mtime_ns and previous["size"] == stat.st_size:
+                content_hash = previous["hash"]
             else:
-                is_embed, target, alias = match.groups()
-                if not is_embed: return match.group(0)
-            
+                content_hash = file_hash(asset_path)
+            converted = self.image_stage.converts(asset_path, content_hash, self.metrics)
+            self._asset_extensions[key] = extension if converted else asset_path.suffix
+        return self._asset_extensions[key]
+
+    def _process_assets(self, content: str, links: list | None = None, assets: list | None = None,
+                        targets: dict | None = None) -> str:
+        """
+        Reescribe las rutas de los adjuntos referenciados (embeds e imágenes markdown)
+        en una sola pasada, sin tocar el código. Si se pasa `assets`, los adjuntos se
+        añaden a esa lista en lugar de copiarse de inmediato. Si se pasa `links`, los
+        destinos de los wikilinks que no son embeds se añaden a esa lista.
+        En `targets` se anota cómo se ha resuelto cada destino de adjunto.
+        """
+        def asset_replacer(target: str, alias: str | None) -> str | None:
             asset_path = self.find_file_in_vault(target)
+            if targets is not None:
+                targets[target] = str(asset_path) if asset_path else None
             if asset_path and asset_path.suffix.lower() in ATTACHMENT_EXTENSIONS:
-                if asset_path not in self.copied_assets:
-                    shutil.copy(asset_path, self.assets_dir)
-                    self.copied_assets.add(asset_path)
+                if assets is not None:
+                    assets.append(asset_path)
+                else:
+                    self._copy_asset(asset_path)
                 
-                new_path = f"../Assets/{asset_path.name}"
+                new_path = f"../Assets/{self._asset_output_name(asset_path)}"
                 return f"![{alias or asset_path.stem}]({new_path})"
-            return match.group(0)
-        return pattern.sub(asset_replacer, content)
+            return None
+
+        content, link_targets = rewrite_links(content, asset_replacer)
+        if links is not None:
+            links.extend(link_targets)
+        return content
 
 def load_app_config() -> dict | None:
     if not CONFIG_FILE.exists():
@@ -159,8 +611,53 @@ def select_depth_from_menu() -> int | None:
         else:
             print("Opción no válida. Por favor, introduce un número del 1 al 5.")
 
+def select_start_note(vault_paths: list[Path]) -> Path | None:
+    """Muestra el diálogo para elegir la nota de inicio en cualquiera de los vaults."""
+    from tkinter import Tk, filedialog
+    try:
+        root = Tk(); root.withdraw()
+        start_note_str = filedialog.askopenfilename(
+            title=f"Select the starting note ({', '.join(v.name for v in vault_paths)})",
+            initialdir=vault_paths[0],
+            filetypes=[("Markdown files", "*.md")]
+        )
+    except (ImportError, RuntimeError) as e:
+        logging.error(f"Could not display file dialog: {e}.")
+        sys.exit(1)
+    return Path(start_note_str) if start_note_str else None
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Construye un paquete de exportación a partir de una nota de Obsidian.")
+    parser.add_argument("--rebuild-index", action="store_true",
+                        help="Ignora la caché del índice del vault y lo reconstruye desde cero.")
+    parser.add_argument("--cross-vault", action="store_true",
+                        help="Resuelve en los demás vaults configurados los enlaces que no existen en el de la nota.")
+    parser.add_argument("--update", metavar="EXPORT_DIR",
+                        help="Actualiza una exportación existente reescribiendo solo lo que ha cambiado.")
+    parser.add_argument("--asset-strategy", choices=COPY_STRATEGIES, default="copy",
+                        help="Cómo se copian los adjuntos: copia normal, reflink/copy_file_range o enlace duro.")
+    parser.add_argument("--asset-workers", type=int, default=4, metavar="N",
+                        help="Número de hilos que copian adjuntos en segundo plano.")
+    parser.add_argument("--profile", choices=PROFILE_MODES,
+                        help="Captura un perfil (cProfile o tracemalloc) de la exportación en el informe.")
+    parser.add_argument("--workers", type=int, default=1, metavar="N",
+                        help="Número de hilos para leer y escribir notas (1 = modo secuencial).")
+    parser.add_argument("--archive", choices=ARCHIVE_FORMATS,
+                        help="Escribe la exportación directamente en un archivo .zip o .tar.gz en lugar de una carpeta.")
+    parser.add_argument("--compression-level", type=int, default=DEFAULT_COMPRESSION_LEVEL, metavar="0-9",
+                        help="Nivel de compresión del archivo (los PNG, JPG y PDF se guardan sin recomprimir en zip).")
+    args = parser.parse_args()
+    if args.workers < 1 or args.asset_workers < 1:
+        parser.error("--workers and --asset-workers must be at least 1")
+    if not 0 <= args.compression_level <= 9:
+        parser.error("--compression-level must be between 0 and 9")
+    if args.archive and args.update:
+        parser.error("--update only works with directory exports, not with --archive")
+    return args
+
 def main():
     """Función principal del script."""
+    args = parse_args()
     config = load_app_config()
     if not config:
         sys.exit(1)
@@ -170,36 +667,60 @@ def main():
         logging.error("Please run 'config_tool.py' to complete the setup.")
         sys.exit(1)
 
-    vault_path = Path(config["vault_paths"][0])
+    vault_paths = [Path(v) for v in config["vault_paths"]]
     export_dir = Path(config["export_dir"])
     exclude_folders = config.get("exclude_folders", [])
+    update_dir = Path(args.update) if args.update else None
 
-    logging.info(f"Using Vault: {vault_path}")
-    
-    from tkinter import Tk, filedialog
-    try:
-        root = Tk(); root.withdraw()
-        start_note_str = filedialog.askopenfilename(
-            title=f"Select the starting note from '{vault_path.name}'",
-            initialdir=vault_path,
-            filetypes=[("Markdown files", "*.md")]
-        )
-        if not start_note_str:
+    if update_dir:
+        # La nota de inicio, la profundidad y el vault se toman del manifiesto anterior
+        manifest = load_export_manifest(update_dir)
+        if not manifest:
+            logging.error(f"No valid '{MANIFEST_FILE_NAME}' found in {update_dir}. Cannot update this export.")
+            sys.exit(1)
+        vault_path = Path(manifest["vault_path"])
+        fallback_paths = [Path(v) for v in manifest.get("fallback_vaults", [])]
+        start_note_path = Path(manifest["start_note"])
+        max_depth = manifest["max_depth"]
+        logging.info(f"Using Vault: {vault_path}")
+    else:
+        start_note_path = select_start_note(vault_paths)
+        if not start_note_path:
             logging.warning("No note selected. Exiting."); return
-        start_note_path = Path(start_note_str)
-    except (ImportError, RuntimeError) as e:
-        logging.error(f"Could not display file dialog: {e}.")
-        sys.exit(1)
+        vault_path = find_owning_vault(start_note_path, vault_paths)
+        if not vault_path:
+            logging.error(f"The selected note is not inside any configured vault: {start_note_path}")
+            sys.exit(1)
+        fallback_paths = [v for v in vault_paths if v != vault_path] if args.cross_vault else []
+        logging.info(f"Using Vault: {vault_path}")
 
-    # ### CAMBIO: Usar el nuevo menú en lugar de la entrada libre ###
-    max_depth = select_depth_from_menu()
-    if max_depth is None: # Teóricamente no debería pasar con el bucle, pero es buena práctica
-        logging.error("No depth selected. Exiting.")
-        return
+        # ### CAMBIO: Usar el nuevo menú en lugar de la entrada libre ###
+        max_depth = select_depth_from_menu()
+        if max_depth is None: # Teóricamente no debería pasar con el bucle, pero es buena práctica
+            logging.error("No depth selected. Exiting.")
+            return
 
     # --- Iniciar el Proceso ---
-    builder = ExportBuilder(vault_path, export_dir, exclude_folders)
-    builder.run(start_note_path, max_depth)
+    # Los índices del vault de la nota y de los vaults de respaldo se construyen a la vez
+    index_started = time.perf_counter()
+    indexes = MultiVaultIndex.load([vault_path, *fallback_paths], exclude_folders, INDEX_CACHE_DIR,
+                                   rebuild=args.rebuild_index).indexes
+    index_time = time.perf_counter() - index_started
+    logging.info(f"Indexed {len(indexes)} vault(s) in {index_time:.2f}s.")
+    image_stage = ImageStage.create(IMAGE_CACHE_DIR, image_settings_from_config(config))
+    builder = ExportBuilder(vault_path, export_dir, exclude_folders, rebuild_index=args.rebuild_index,
+                            vault_index=indexes[vault_path],
+                            fallback_vaults={v: indexes[v] for v in fallback_paths},
+                            workers=args.workers, update_dir=update_dir,
+                            asset_strategy=args.asset_strategy, asset_workers=args.asset_workers,
+                            profile=args.profile, archive_format=args.archive,
+                            compression_level=args.compression_level, image_stage=image_stage)
+    builder.metrics.add_time("index", index_time)
+    try:
+        builder.run(start_note_path, max_depth)
+    finally:
+        if image_stage:
+            image_stage.close()
     
     logging.info("\n--- ✅ Export build process completed successfully! ---")
 
@@ -0,0 +1,237 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow es opcional: sin él los adjuntos se copian sin cambios
+    Image = ImageOps = None
+
+# --- Optimización de imágenes ---
+# Antes de copiar una imagen a la exportación se puede reducir (a un tamaño máximo en
+# píxeles o a unos DPI para el ancho de impresión), recomprimir y convertir a otro
+# formato. El resultado se guarda en una caché persistente cuya clave combina el hash
+# de la imagen original con los ajustes, así que cada imagen se procesa una sola vez
+# para todas las exportaciones. Las transformaciones se ejecutan en un pool de procesos.
+# Ajustes ("image_optimization" en config.json):
+#   max_size:       lado mayor máximo en píxeles (None = sin límite).
+#   dpi:            resolución objetivo; limita el lado mayor a dpi * print_width_in y
+#                   se guarda en la imagen para que Pandoc la imprima a ese tamaño.
+#   print_width_in: ancho de impresión en pulgadas (6.5 = A4/carta con márgenes).
+#   quality:        calidad de JPEG (1-95).
+#   convert:        {extensión: nueva extensión}, p. ej. {".png": ".jpg"}. Por defecto
+#                   solo BMP -> PNG, porque xelatex no admite BMP.
+#   workers:        procesos del pool (por defecto, uno por CPU).
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.bmp'}
+SAVE_FORMATS = {'.png': "PNG", '.jpg': "JPEG", '.jpeg': "JPEG"}
+DEFAULT_IMAGE_SETTINGS = {
+    "max_size": 2400,
+    "dpi": None,
+    "print_width_in": 6.5,
+    "quality": 85,
+    "convert": {".bmp": ".png"},
+    "workers": None,
+}
+EXIF_ORIENTATION = 0x0112
+# Se incrementa cuando cambia el resultado de `_optimize_image`, para invalidar la caché
+TRANSFORM_VERSION = 2
+
+
+def image_settings_from_config(config: dict) -> dict | None:
+    """Ajustes de optimización de `config.json`, o None si está desactivada."""
+    settings = config.get("image_optimization")
+    if settings is None or not settings.get("enabled", True):
+        return None
+    settings = {**DEFAULT_IMAGE_SETTINGS, **settings}
+    settings.pop("enabled", None)
+    convert = {}
+    for source, target in settings["convert"].items():
+        source, target = source.lower(), target.lower()
+        if source in IMAGE_EXTENSIONS and target in SAVE_FORMATS:
+            convert[source] = target
+        else:
+            logging.warning(f"Ignoring unsupported image conversion: {source} -> {target}")
+    settings["convert"] = convert
+    return settings
+
+
+def _max_side(settings: dict) -> int | None:
+    limits = [settings["max_size"]]
+    if settings["dpi"]:
+        limits.append(int(settings["dpi"] * settings["print_width_in"]))
+    limits = [limit for limit in limits if limit]
+    return min(limits) if limits else None
+
+
+def _optimize_image(source: str, destination: str, suffix: str, settings: dict) -> int:
+    """
+    Se ejecuta en un proceso del pool. Guarda en `destination` la imagen reducida y
+    recomprimida con el formato de `suffix` y devuelve su tamaño. Si sin cambiar de
+    formato ni de tamaño el resultado no es menor, se guarda la imagen original.
+    """
+    tmp_file = f"{destination}.{os.getpid()}.tmp"
+    with Image.open(source) as image:
+        image.load()
+        original_size = image.size
+        # Se aplica la orientación EXIF (fotos de móvil): LaTeX la ignora y la etiqueta
+        # no se conserva al guardar, así que la imagen saldría girada
+        rotated = image.getexif().get(EXIF_ORIENTATION, 1) != 1
+        if rotated:
+            image = ImageOps.exif_transpose(image)
+        max_side = _max_side(settings)
+        if max_side and max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        save_format = SAVE_FORMATS[suffix]
+        options = {"optimize": True}
+        if save_format == "JPEG":
+            options.update(quality=settings["quality"], progressive=True)
+            if image.mode not in ("RGB", "L"):
+                # JPEG no admite transparencia: se aplana sobre fondo blanco
+                rgba = image.convert("RGBA")
+                image = Image.new("RGB", rgba.size, "white")
+                image.paste(rgba, mask=rgba.getchannel("A"))
+        elif image.mode == "CMYK":
+            image = image.convert("RGB")
+        if settings["dpi"]:
+            options["dpi"] = (settings["dpi"], settings["dpi"])
+        image.save(tmp_file, save_format, **options)
+    unchanged = not rotated and image.size == original_size and Path(source).suffix.lower() == suffix
+    if unchanged and os.path.getsize(tmp_file) >= os.path.getsize(source):
+        shutil.copyfile(source, tmp_file)
+    os.replace(tmp_file, destination)
+    return os.path.getsize(destination)
+
+
+class ImageStage:
+    """
+    Optimiza las imágenes de la exportación en un pool de procesos, con una caché
+    persistente en `cache_dir`. Se puede compartir entre varias exportaciones a la vez
+    (p. ej. en batch_export); quien la crea debe llamar a `close()`.
+    """
+    def __init__(self, cache_dir: Path, settings: dict):
+        self.cache_dir = cache_dir
+        self.settings = settings
+        cache_settings = {k: v for k, v in settings.items() if k != "workers"}
+        self.key = hashlib.sha256(json.dumps([TRANSFORM_VERSION, cache_settings], sort_keys=True)
+                                  .encode('utf-8')).hexdigest()[:16]
+        self._pool = self._new_pool()
+        self._inflight = {}
+        self._failed = {}
+        self._lock = threading.Lock()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # "spawn" porque el pool se usa desde los hilos de AssetStage (fork con hilos no es seguro)
+        return ProcessPoolExecutor(max_workers=self.settings["workers"], mp_context=multiprocessing.get_context("spawn"))
+
+    @classmethod
+    def create(cls, cache_dir: Path, settings: dict | None) -> "ImageStage | None":
+        """Crea la etapa si hay ajustes y Pillow está instalado; si no, devuelve None."""
+        if not settings:
+            return None
+        if Image is None:
+            logging.warning("Image optimization is enabled but Pillow is not installed "
+                            "(pip install Pillow); images will be copied unchanged.")
+            return None
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        return cls(cache_dir, settings)
+
+    def handles(self, path: Path) -> bool:
+        return path.suffix.lower() in IMAGE_EXTENSIONS
+
+    def same_format(self, suffix: str, other: str) -> bool:
+        """True si las dos extensiones corresponden al mismo formato (p. ej. .jpg y .jpeg)."""
+        suffix, other = suffix.lower(), other.lower()
+        return SAVE_FORMATS.get(suffix, suffix) == SAVE_FORMATS.get(other, other)
+
+    def output_suffix(self, path: Path) -> str:
+        """Extensión que tendrá el adjunto en la exportación."""
+        suffix = path.suffix.lower()
+        if suffix not in IMAGE_EXTENSIONS:
+            return path.suffix
+        target = self.settings["convert"].get(suffix)
+        if target:
+            return target
+        # Un BMP sin conversión no se puede recomprimir como BMP: se guarda como PNG
+        return path.suffix if suffix in SAVE_FORMATS else ".png"
+
+    def transform(self, source: Path, content_hash: str, metrics=None) -> Path:
+        """
+        Devuelve la ruta de la imagen optimizada en la caché, creándola si no existe.
+        Varias peticiones de la misma imagen a la vez esperan a una única transformación.
+        Si falla, lanza la excepción y la recuerda: la misma imagen no se vuelve a
+        intentar mientras viva la etapa. Si un proceso del pool muere (p. ej. por falta
+        de memoria), el pool se sustituye y la transformación se reintenta una vez.
+        """
+        suffix = self.output_suffix(source).lower()
+        key = hashlib.sha256(f"{self.key}:{content_hash}".encode('utf-8')).hexdigest()
+        cache_file = self.cache_dir / f"{key}{suffix}"
+        if cache_file.exists():
+            if metrics is not None:
+                metrics.count("image_cache_hits")
+            return cache_file
+        for attempt in range(2):
+            with self._lock:
+                if cache_file in self._failed:
+                    raise RuntimeError(self._failed[cache_file])
+                future = self._inflight.get(cache_file)
+                owner = future is None
+                if owner:
+                    pool = self._pool
+                    future = pool.submit(_optimize_image, str(source), str(cache_file), suffix, self.settings)
+                    self._inflight[cache_file] = future
+            try:
+                size = future.result()
+                break
+            except BrokenProcessPool as e:
+                if owner:
+                    self._replace_pool(pool)
+                    if attempt:
+                        self._remember_failure(cache_file, e)
+                if attempt:
+                    raise
+            except Exception as e:
+                if owner:
+                    self._remember_failure(cache_file, e)
+                raise
+            finally:
+                if owner:
+                    with self._lock:
+                        self._inflight.pop(cache_file, None)
+        if metrics is not None and owner:
+            metrics.count("images_optimized")
+            metrics.count("image_bytes_saved", source.stat().st_size - size)
+        return cache_file
+
+    def converts(self, source: Path, content_hash: str, metrics=None) -> bool:
+        """
+        Transforma ya `source` si la optimización cambia su formato y devuelve si se ha
+        podido. El enlace de la nota solo debe usar la nueva extensión si es True.
+        """
+        try:
+            self.transform(source, content_hash, metrics)
+            return True
+        except Exception as e:
+            logging.warning(f"Could not convert image {source}, exporting it unchanged: {e}")
+            return False
+
+    def _remember_failure(self, cache_file: Path, error: Exception):
+        with self._lock:
+            self._failed[cache_file] = f"{type(error).__name__}: {error}"
+
+    def _replace_pool(self, broken: ProcessPoolExecutor):
+        """Sustituye el pool roto (una sola vez aunque lo detecten varios hilos)."""
+        with self._lock:
+            if self._pool is broken:
+                logging.warning("An image worker process died; restarting the image pool.")
+                self._pool = self._new_pool()
+        broken.shutdown(wait=False)
+
+    def close(self):
+        self._pool.shutdown(wait=True)
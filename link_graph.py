@@ -0,0 +1,224 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from vault_index import (load_vault_dirs, build_index_from_dirs, iter_vault_files, resolve_target, VaultIndex,
+                         cache_key, cache_file_for)
+from link_tokenizer import scan_links
+from export_builder import CONFIG_FILE, INDEX_CACHE_DIR, ATTACHMENT_EXTENSIONS, load_app_config
+
+# --- Caché persistente del grafo de enlaces ---
+# Por cada nota se guardan su mtime, su tamaño y los destinos de sus wikilinks,
+# embeds e imágenes markdown tal y como aparecen en el texto. La resolución con el
+# índice del vault se hace al cargar, así un archivo nuevo o borrado en el vault
+# cambia los enlaces resueltos sin tener que releer las notas que lo enlazan.
+GRAPH_CACHE_VERSION = 4
+
+
+class Reachability:
+    """Resultado de una consulta de alcance: notas en orden de exportación y adjuntos."""
+    def __init__(self, notes: list, assets: list, note_bytes: int, asset_bytes: int, elapsed: float):
+        self.notes = notes
+        self.assets = assets
+        self.note_bytes = note_bytes
+        self.asset_bytes = asset_bytes
+        self.elapsed = elapsed
+
+    @property
+    def total_bytes(self) -> int:
+        return self.note_bytes + self.asset_bytes
+
+    def summary(self) -> str:
+        return (f"{len(self.notes)} notes, {len(self.assets)} assets, "
+                f"{self.total_bytes / 1e6:.1f} MB ({self.elapsed * 1000:.1f} ms)")
+
+
+class LinkGraph:
+    """
+    Grafo de enlaces del vault con caché en disco. Cada nota se vuelve a leer solo
+    si su mtime o su tamaño han cambiado desde la última vez.
+    """
+    def __init__(self, vault_path: Path, index: VaultIndex, notes: dict):
+        self.vault_path = vault_path
+        self.index = index
+        # ruta completa (str) -> [mtime_ns, size, links, embeds, images]
+        self.notes = notes
+        self._resolved = {}
+        self._asset_sizes = {}
+
+    @classmethod
+    def load(cls, vault_path: Path, exclude_folders: list, cache_dir: Path = INDEX_CACHE_DIR,
+             rebuild: bool = False, workers: int = 8) -> "LinkGraph":
+        dirs = load_vault_dirs(vault_path, exclude_folders, cache_dir, rebuild)
+        index = build_index_from_dirs(vault_path, dirs)
+
+        key = cache_key(vault_path, exclude_folders)
+        cache_file = cache_file_for(cache_dir, key, kind="graph")
+        cached = {} if rebuild else _load_cached_graph(cache_file, key)
+
+        notes, stale = {}, []
+        for path in iter_vault_files(vault_path, dirs):
+            if not path.lower().endswith('.md'):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entry = cached.get(path)
+            if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+                notes[path] = entry
+            else:
+                stale.append((path, stat))
+
+        reused = len(notes)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for path, entry in zip((p for p, _ in stale), pool.map(_read_graph_entry, stale)):
+                if entry is not None:
+                    notes[path] = entry
+        logging.info(f"Link graph: {reused} notes reused from cache, {len(stale)} re-read.")
+
+        if stale or len(notes) != len(cached):
+            try:
+                _save_cached_graph(cache_file, key, notes)
+            except OSError as e:
+                logging.warning(f"Could not save link graph cache: {e}")
+        return cls(vault_path, index, notes)
+
+    def resolve(self, target: str) -> Path | None:
+        if target not in self._resolved:
+            self._resolved[target] = resolve_target(self.index, target)
+        return self._resolved[target]
+
+    def outgoing_notes(self, note_path: Path) -> list[Path]:
+        """Notas .md enlazadas desde `note_path`, en el orden en que aparecen."""
+        entry = self.notes.get(str(note_path))
+        if not entry:
+            return []
+        linked = (self.resolve(t) for t in entry[2])
+        return [p for p in linked if p and p.suffix.lower() == '.md']
+
+    def outgoing_assets(self, note_path: Path) -> list[Path]:
+        """Adjuntos embebidos o enlazados como imagen markdown desde `note_path`."""
+        entry = self.notes.get(str(note_path))
+        if not entry:
+            return []
+        assets = (self.resolve(t) for t in entry[3] + entry[4])
+        return [p for p in assets if p and p.suffix.lower() in ATTACHMENT_EXTENSIONS]
+
+    def reachable(self, start_note_path: Path, max_depth: int) -> Reachability:
+        """
+        Notas y adjuntos que incluiría una exportación desde `start_note_path` con
+        `max_depth` (-1 = sin límite). Usa el mismo recorrido en profundidad que
+        ExportBuilder.explore_and_copy, así que el resultado coincide con la exportación.
+        """
+        started = time.perf_counter()
+        visited, order, assets = set(), [], {}
+        stack = [(start_note_path, 0)]
+        while stack:
+            note_path, depth = stack.pop()
+            if (max_depth != -1 and depth > max_depth) or note_path in visited:
+                continue
+            visited.add(note_path)
+            order.append((note_path, depth))
+            for asset_path in self.outgoing_assets(note_path):
+                assets.setdefault(asset_path, None)
+            if max_depth != -1 and depth >= max_depth:
+                continue
+            for linked_note_path in reversed(self.outgoing_notes(note_path)):
+                stack.append((linked_note_path, depth + 1))
+
+        note_bytes = sum(self.notes[str(p)][1] for p, _ in order if str(p) in self.notes)
+        asset_bytes = sum(self._asset_size(p) for p in assets)
+        return Reachability(order, list(assets), note_bytes, asset_bytes, time.perf_counter() - started)
+
+    def _asset_size(self, asset_path: Path) -> int:
+        if asset_path not in self._asset_sizes:
+            try:
+                self._asset_sizes[asset_path] = asset_path.stat().st_size
+            except OSError:
+                self._asset_sizes[asset_path] = 0
+        return self._asset_sizes[asset_path]
+
+
+def _read_graph_entry(item: tuple) -> list | None:
+    path, stat = item
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        logging.warning(f"Could not read {path}: {e}")
+        return None
+    links, embeds, images = scan_links(content)
+    return [stat.st_mtime_ns, stat.st_size, links, embeds, images]
+
+
+def _load_cached_graph(cache_file: Path, key: str) -> dict:
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != GRAPH_CACHE_VERSION or data.get("key") != key:
+        return {}
+    return data.get("notes", {})
+
+
+def _save_cached_graph(cache_file: Path, key: str, notes: dict):
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_suffix(".tmp")
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump({"version": GRAPH_CACHE_VERSION, "key": key, "notes": notes}, f)
+    os.replace(tmp_file, cache_file)
+
+
+def main():
+    """Vista previa de una exportación: cuenta notas, adjuntos y bytes sin copiar nada."""
+    parser = argparse.ArgumentParser(description="Calcula qué incluiría una exportación sin ejecutarla.")
+    parser.add_argument("start_note", help="Ruta o nombre de la nota de inicio.")
+    parser.add_argument("--depth", type=int, default=1, help="Profundidad máxima (-1 = sin límite).")
+    parser.add_argument("--vault", help=f"Ruta del vault (por defecto, el primero de {CONFIG_FILE}).")
+    parser.add_argument("--rebuild-index", action="store_true", help="Ignora las cachés y relee el vault.")
+    parser.add_argument("--max-notes", type=int, help="Termina con error si se superan estas notas.")
+    parser.add_argument("--max-mb", type=float, help="Termina con error si se superan estos MB.")
+    parser.add_argument("--list", action="store_true", help="Muestra las notas incluidas en orden.")
+    args = parser.parse_args()
+
+    # Con --vault el archivo de configuración es opcional (solo aporta las carpetas excluidas)
+    config = (load_app_config() if CONFIG_FILE.exists() or not args.vault else None) or {}
+    if args.vault:
+        vault_path = Path(args.vault)
+    elif config.get("vault_paths"):
+        vault_path = Path(config["vault_paths"][0])
+    else:
+        logging.error("No vault configured. Use --vault or run 'config_tool.py'.")
+        sys.exit(1)
+
+    graph = LinkGraph.load(vault_path, config.get("exclude_folders", []), rebuild=args.rebuild_index)
+    start_note_path = Path(args.start_note)
+    if str(start_note_path) not in graph.notes:
+        start_note_path = graph.resolve(start_note_path.name)
+    if not start_note_path or str(start_note_path) not in graph.notes:
+        logging.error(f"Start note not found in vault: {args.start_note}")
+        sys.exit(1)
+
+    result = graph.reachable(start_note_path, args.depth)
+    if args.list:
+        for note_path, depth in result.notes:
+            print(f"{'    ' * depth}- {note_path.stem}")
+    logging.info(f"Preview (depth {args.depth}): {result.summary()}")
+
+    if args.max_notes is not None and len(result.notes) > args.max_notes:
+        logging.error(f"Export rejected: {len(result.notes)} notes exceed the limit of {args.max_notes}.")
+        sys.exit(2)
+    if args.max_mb is not None and result.total_bytes / 1e6 > args.max_mb:
+        logging.error(f"Export rejected: {result.total_bytes / 1e6:.1f} MB exceed the limit of {args.max_mb} MB.")
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import re
+
+# --- Tokenizador de enlaces de Obsidian ---
+# Una sola expresión regular reconoce en una única pasada:
+#   wikilink: [[nota]], [[nota#encabezado]], [[nota|alias]] y los embeds ![[...]]
+#   image:    imágenes markdown ![alt](ruta)
+#   fence:    bloques de código delimitados con ``` o ~~~ (se dejan intactos). Se cierran
+#             con una línea de al menos tantos caracteres como la apertura (CommonMark).
+#             Delante de la apertura puede haber hasta MAX_FENCE_INDENT espacios o
+#             tabuladores, para reconocer los bloques dentro de listas; no se reconocen
+#             los que empiezan en la misma línea que la viñeta (- ```python).
+#   code:     código en línea entre comillas invertidas (se deja intacto)
+# El lookahead inicial permite a `re` saltar directamente a los caracteres que pueden
+# abrir un token, en lugar de probar todas las alternativas en cada posición.
+MAX_FENCE_INDENT = 16
+# `re` solo admite lookbehind de anchura fija: una alternativa por cada sangría posible
+_FENCE_START = "|".join(["^"] + [f"(?<=^[ \\t]{{{n}}})" for n in range(1, MAX_FENCE_INDENT + 1)])
+TOKEN_PATTERN = re.compile(r'''(?=[`~!\[])(?:
+    (?P<wikilink>(?P<embed>!?)\[\[(?P<target>[^|#\]\n]*)(?:\#(?P<heading>[^|\]\n]*))?(?:\|(?P<alias>[^\]\n]+))?\]\])
+  | (?P<image>!\[(?P<image_alt>[^\n]*?)\]\((?P<image_target>[^\n]*?)\))
+  | (?P<fence>(?:FENCE_START)(?P<fence_chars>`{3,}|~{3,})[^\n]*\n[\s\S]*?
+        (?:^[ \t]*(?P=fence_chars)(?:(?<=`)`*|(?<=~)~*)[ \t]*$|\Z))
+  | (?P<code>(?<!`)(?P<ticks>`+)(?!`)[^\n]*?(?<!`)(?P=ticks)(?!`))
+)'''.replace("FENCE_START", _FENCE_START), re.VERBOSE | re.MULTILINE)
+
+
+def scan_links(content: str) -> tuple[list, list, list]:
+    """
+    Devuelve los destinos (sin resolver) de los wikilinks, los embeds y las imágenes
+    markdown de la nota, en el orden en que aparecen e ignorando el código.
+    """
+    links, embeds, images = [], [], []
+    for match in TOKEN_PATTERN.finditer(content):
+        kind = match.lastgroup
+        if kind == "wikilink":
+            target = match.group("target")
+            if target:
+                (embeds if match.group("embed") else links).append(target)
+        elif kind == "image":
+            images.append(match.group("image_target"))
+    return links, embeds, images
+
+
+def rewrite_links(content: str, replace_asset) -> tuple[str, list]:
+    """
+    Reescribe los embeds y las imágenes markdown de la nota en una sola pasada y
+    devuelve el contenido nuevo junto con los destinos de los wikilinks (sin embeds).
+    `replace_asset(target, alias)` devuelve el texto de reemplazo, o None para dejar
+    el enlace como está. El código (bloques y en línea) no se modifica.
+    """
+    links = []
+
+    def replacer(match: re.Match) -> str:
+        kind = match.lastgroup
+        if kind == "wikilink":
+            target = match.group("target")
+            if not target:
+                return match.group(0)
+            if not match.group("embed"):
+                links.append(target)
+                return match.group(0)
+            replacement = replace_asset(target, match.group("alias"))
+        elif kind == "image":
+            replacement = replace_asset(match.group("image_target"), match.group("image_alt"))
+        else:
+            return match.group(0)
+        return match.group(0) if replacement is None else replacement
+
+    return TOKEN_PATTERN.sub(replacer, content), links
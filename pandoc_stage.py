@@ -0,0 +1,155 @@
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+import subprocess
+from pathlib import Path
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Conversión por etapas con caché de AST ---
+# Cada nota se convierte por separado al AST JSON de pandoc, con varios procesos de
+# pandoc a la vez. Los AST se guardan en caché con una clave que combina el
+# contenido de la nota, la versión de pandoc y las opciones de lectura, así que al
+# cambiar una nota solo se vuelve a analizar esa nota. Los AST se unen en el orden
+# del MOC y el documento final se genera con una única llamada a pandoc.
+MOC_FILE_NAME = "_MOC_Guide.md"
+AST_CACHE_DIR_NAME = ".ast_cache"
+READ_OPTIONS = ["--from", "markdown+yaml_metadata_block"]
+MOC_LINK_PATTERN = re.compile(r'^\s*- \[.*\]\(\./(.+\.md)\)\s*$', re.MULTILINE)
+
+
+class PandocError(Exception):
+    """Fallo de pandoc al analizar una nota; `stderr` contiene su salida de error."""
+    def __init__(self, message: str, stderr: str = ""):
+        super().__init__(message)
+        self.stderr = stderr
+
+
+@lru_cache(maxsize=None)
+def pandoc_version() -> str:
+    result = subprocess.run(["pandoc", "--version"], capture_output=True, text=True, check=True)
+    return result.stdout.splitlines()[0].strip()
+
+
+def order_by_moc(input_files: list[Path]) -> list[Path]:
+    """
+    Ordena las notas según el MOC de la exportación (sin incluir el propio MOC).
+    Las notas que no aparecen en el MOC se añaden al final en el orden recibido.
+    """
+    moc = next((f for f in input_files if f.name == MOC_FILE_NAME), None)
+    remaining = [f for f in input_files if f.name != MOC_FILE_NAME]
+    if moc is None:
+        return remaining
+    by_path = {f.resolve(): f for f in remaining}
+    ordered = []
+    for name in MOC_LINK_PATTERN.findall(moc.read_text(encoding='utf-8')):
+        note = by_path.pop((moc.parent / name).resolve(), None)
+        if note is not None:
+            ordered.append(note)
+    return ordered + [f for f in remaining if f.resolve() in by_path]
+
+
+def ast_cache_key(content: bytes, version: str, options: list) -> str:
+    digest = hashlib.sha256()
+    digest.update(json.dumps([version, options]).encode('utf-8'))
+    digest.update(b"\0")
+    digest.update(content)
+    return digest.hexdigest()
+
+
+class AstCache:
+    """Analiza notas a AST JSON de pandoc en paralelo, reutilizando los ya analizados."""
+    def __init__(self, cache_dir: Path, options: list = READ_OPTIONS, workers: int = 4, metrics=None):
+        self.cache_dir = cache_dir
+        self.options = list(options)
+        self.workers = workers
+        self.metrics = metrics
+        self.counts = {"ast_cache_hits": 0, "notes_parsed": 0}
+        self._lock = threading.Lock()
+
+    def parse_all(self, note_files: list[Path]) -> list[dict]:
+        """Devuelve los AST de `note_files` en el mismo orden y borra de la caché los que ya no se usan."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        version = pandoc_version()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(lambda path: self._load_or_parse(path, version), note_files))
+        used = {key for key, _ in results}
+        for cache_file in self.cache_dir.glob("*.json"):
+            if cache_file.stem not in used:
+                cache_file.unlink(missing_ok=True)
+        logging.info(f"AST de las notas: {self.counts['ast_cache_hits']} reutilizados de la caché, "
+                     f"{self.counts['notes_parsed']} analizados con pandoc.")
+        return [ast for _, ast in results]
+
+    def _load_or_parse(self, note_path: Path, version: str) -> tuple[str, dict]:
+        content = note_path.read_bytes()
+        key = ast_cache_key(content, version, self.options)
+        cache_file = self.cache_dir / f"{key}.json"
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                ast = json.load(f)
+            self._count("ast_cache_hits")
+            return key, ast
+        except (OSError, ValueError):
+            pass
+
+        started = time.perf_counter()
+        result = subprocess.run(["pandoc", *self.options, "--to", "json"], input=content, capture_output=True)
+        if self.metrics is not None:
+            self.metrics.add_time("pandoc_parse", time.perf_counter() - started)
+        if result.returncode != 0:
+            raise PandocError(f"Pandoc no pudo analizar la nota '{note_path.name}'.",
+                              result.stderr.decode('utf-8', errors='replace'))
+        ast = json.loads(result.stdout)
+        tmp_file = cache_file.with_name(f"{key}.{threading.get_ident()}.tmp")
+        tmp_file.write_bytes(result.stdout)
+        tmp_file.replace(cache_file)
+        self._count("notes_parsed")
+        return key, ast
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counts[name] += 1
+        if self.metrics is not None:
+            self.metrics.count(name)
+
+
+def merge_asts(asts: list[dict]) -> dict:
+    """
+    Une los AST en un solo documento. Los metadatos se combinan como lo haría pandoc
+    con varios bloques YAML (el último valor de cada campo gana) y los identificadores
+    de encabezado repetidos entre notas reciben un sufijo (-1, -2, ...).
+    """
+    if not asts:
+        raise ValueError("No hay notas que unir.")
+    merged = {"pandoc-api-version": asts[0]["pandoc-api-version"], "meta": {}, "blocks": []}
+    seen_ids = set()
+    for ast in asts:
+        merged["meta"].update(ast.get("meta", {}))
+        _dedupe_header_ids(ast["blocks"], seen_ids)
+        merged["blocks"].extend(ast["blocks"])
+    return merged
+
+
+def _dedupe_header_ids(node, seen_ids: set):
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+        elif isinstance(node, dict):
+            if node.get("t") == "Header":
+                attr = node["c"][1]
+                identifier = attr[0]
+                if identifier:
+                    n = 1
+                    while attr[0] in seen_ids:
+                        attr[0] = f"{identifier}-{n}"
+                        n += 1
+                    seen_ids.add(attr[0])
+            content = node.get("c")
+            if isinstance(content, (list, dict)):
+                stack.append(content)
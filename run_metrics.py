@@ -0,0 +1,103 @@
+import io
+import json
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from pathlib import Path
+from contextlib import contextmanager
+
+# --- Métricas de ejecución ---
+# Cada fase acumula tiempo de reloj y tiempo de CPU del hilo que la ejecuta, de
+# modo que las fases que corren en varios hilos a la vez suman el trabajo de todos.
+# Las fases pueden anidarse (p. ej. "read" dentro de "explore").
+PROFILE_MODES = ("cprofile", "tracemalloc")
+
+
+class RunMetrics:
+    """Recoge tiempos por fase, contadores y detalles de una ejecución y los guarda en JSON."""
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+        self.details = {}
+        self._lock = threading.Lock()
+        self._started_wall = time.perf_counter()
+        self._started_cpu = time.process_time()
+
+    @contextmanager
+    def phase(self, name: str):
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+            with self._lock:
+                stats = self.phases.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0, "calls": 0})
+                stats["wall_s"] += wall
+                stats["cpu_s"] += cpu
+                stats["calls"] += 1
+
+    def add_time(self, name: str, seconds: float):
+        """Suma a una fase un tiempo medido fuera del proceso (p. ej. un subproceso)."""
+        with self._lock:
+            stats = self.phases.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0, "calls": 0})
+            stats["wall_s"] += seconds
+            stats["calls"] += 1
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def append(self, name: str, item):
+        """Añade un elemento a una lista de detalles del informe (p. ej. enlaces sin resolver)."""
+        with self._lock:
+            self.details.setdefault(name, []).append(item)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "total_wall_s": time.perf_counter() - self._started_wall,
+                "total_cpu_s": time.process_time() - self._started_cpu,
+                "phases": {k: dict(v) for k, v in self.phases.items()},
+                "counters": dict(self.counters),
+                **{k: list(v) if isinstance(v, list) else v for k, v in self.details.items()},
+            }
+
+    def report_json(self, **extra) -> str:
+        return json.dumps({**extra, **self.to_dict()}, indent=2)
+
+    def write_report(self, report_path: Path, **extra):
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.write(self.report_json(**extra))
+
+    @contextmanager
+    def capture(self, mode: str | None, output_dir: Path, name: str):
+        """
+        Captura opcional de perfil alrededor de un bloque:
+        - "cprofile": guarda <name>.pstats en `output_dir` y las funciones más costosas en el informe.
+        - "tracemalloc": guarda en el informe el pico de memoria y las líneas que más memoria asignan.
+        """
+        if mode == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                profiler.dump_stats(output_dir / f"{name}.pstats")
+                summary = io.StringIO()
+                pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(25)
+                self.details["cprofile_top"] = summary.getvalue().splitlines()
+        elif mode == "tracemalloc":
+            tracemalloc.start()
+            try:
+                yield
+            finally:
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                self.details["tracemalloc_peak_bytes"] = peak
+                self.details["tracemalloc_top"] = [str(stat) for stat in snapshot.statistics("lineno")[:25]]
+        else:
+            yield
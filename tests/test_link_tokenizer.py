@@ -0,0 +1,83 @@
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from link_tokenizer import scan_links, rewrite_links  # noqa: E402
+
+
+def links(content: str) -> list:
+    return scan_links(content)[0]
+
+
+class FenceTest(unittest.TestCase):
+    def test_fence_closed_by_longer_run(self):
+        self.assertEqual(links("```\n[[A]]\n````\n[[C]]\n"), ["C"])
+        self.assertEqual(links("~~~\n[[A]]\n~~~~~\n[[C]]\n"), ["C"])
+
+    def test_shorter_run_does_not_close_fence(self):
+        self.assertEqual(links("````\n[[A]]\n```\n[[B]]\n````\n[[C]]\n"), ["C"])
+
+    def test_other_fence_char_does_not_close_fence(self):
+        self.assertEqual(links("```\n[[A]]\n~~~\n[[B]]\n```\n[[C]]\n"), ["C"])
+        self.assertEqual(links("```\n[[A]]\n```~\n[[B]]\n```\n[[C]]\n"), ["C"])
+
+    def test_indented_fence(self):
+        self.assertEqual(links("   ```\n[[A]]\n   ```\n[[C]]\n"), ["C"])
+        self.assertEqual(links("\t\t```\n[[A]]\n\t\t```\n[[C]]\n"), ["C"])
+
+    def test_fence_inside_list_item(self):
+        content = "- item\n    ```python\n    [[A]]\n    ```\n- [[C]]\n"
+        self.assertEqual(links(content), ["C"])
+        rewritten, _ = rewrite_links(content + "    ```\n    ![[x.png]]\n    ```\n", lambda t, a: "IMG")
+        self.assertIn("![[x.png]]", rewritten)
+
+    def test_unclosed_fence_runs_to_end(self):
+        self.assertEqual(links("[[A]]\n```\n[[B]]\n![[c.png]]\n"), ["A"])
+        self.assertEqual(scan_links("```\n![[c.png]]")[1], [])
+
+    def test_fence_not_at_line_start_is_not_a_fence(self):
+        self.assertEqual(links("text ```\n[[A]]\n"), ["A"])
+
+
+class InlineCodeTest(unittest.TestCase):
+    def test_single_backticks(self):
+        self.assertEqual(links("`[[A]]` [[B]]"), ["B"])
+
+    def test_multiple_backticks(self):
+        self.assertEqual(links("``code with ` and [[A]]`` [[B]]"), ["B"])
+        self.assertEqual(links("```inline [[A]]``` [[B]]"), ["B"])
+
+    def test_unmatched_backticks_do_not_hide_links(self):
+        self.assertEqual(links("a `` b [[A]] ` c"), ["A"])
+
+
+class LinkTest(unittest.TestCase):
+    def test_heading_and_alias(self):
+        self.assertEqual(links("[[Note#Section]] [[Other|shown]] [[Both#H|alias]]"), ["Note", "Other", "Both"])
+
+    def test_heading_only_link_is_ignored(self):
+        self.assertEqual(links("[[#Local heading]]"), [])
+
+    def test_scan_separates_embeds_and_images(self):
+        self.assertEqual(scan_links("[[A]] ![[b.png]] ![alt](c.png)"), (["A"], ["b.png"], ["c.png"]))
+
+    def test_rewrite_replaces_embeds_and_images(self):
+        calls = []
+
+        def replace(target, alias):
+            calls.append((target, alias))
+            return f"![{alias or target}](../Assets/{target})"
+
+        rewritten, targets = rewrite_links("[[A|x]] ![[b.png|Fig]] ![c](c.png) `![[d.png]]`", replace)
+        self.assertEqual(rewritten, "[[A|x]] ![Fig](../Assets/b.png) ![c](../Assets/c.png) `![[d.png]]`")
+        self.assertEqual(targets, ["A"])
+        self.assertEqual(calls, [("b.png", "Fig"), ("c.png", "c")])
+
+    def test_rewrite_keeps_link_when_replacement_is_none(self):
+        rewritten, _ = rewrite_links("![[missing.png]]", lambda t, a: None)
+        self.assertEqual(rewritten, "![[missing.png]]")
+
+
+if __name__ == "__main__":
+    unittest.main()
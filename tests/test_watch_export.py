@@ -0,0 +1,85 @@
+import re
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from export_builder import load_export_manifest  # noqa: E402
+import watch_export  # noqa: E402
+from watch_export import WatchSession  # noqa: E402
+
+
+class RewriteInPlaceTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        # La caché del índice va a la carpeta temporal, no junto a config.json
+        patcher = mock.patch.object(watch_export, "INDEX_CACHE_DIR", self.tmp / "index_cache")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.vault = self.tmp / "vault"
+        self.vault.mkdir()
+        (self.vault / "Start.md").write_text("# Start\n[[Alpha]]\n", encoding='utf-8')
+        self.alpha = self.vault / "Alpha.md"
+        self.alpha.write_text("original\n", encoding='utf-8')
+        self.export_root = self.tmp / "export"
+        self.session = WatchSession(self.vault, self.export_root, self.vault / "Start.md", 1, [])
+        self.session.refresh(set())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def exported_alpha(self) -> str:
+        return (self.export_root / "Notes" / "Alpha.md").read_text(encoding='utf-8')
+
+    def test_edit_then_revert_rewrites_the_note(self):
+        self.alpha.write_text("edited\n", encoding='utf-8')
+        self.session.refresh({self.alpha})
+        self.assertEqual(self.exported_alpha(), "edited\n")
+
+        self.alpha.write_text("original\n", encoding='utf-8')
+        self.session.refresh({self.alpha})
+        self.assertEqual(self.exported_alpha(), "original\n")
+        # El manifiesto describe lo que hay en disco, así que un --update posterior también es correcto
+        manifest = load_export_manifest(self.export_root)
+        entry = next(e for e in manifest["notes"] if e["source"] == str(self.alpha))
+        fresh = WatchSession(self.vault, self.export_root, self.vault / "Start.md", 1, [])
+        fresh.refresh(set())
+        self.assertEqual(self.exported_alpha(), "original\n")
+        self.assertEqual(entry, next(e for e in load_export_manifest(self.export_root)["notes"]
+                                     if e["source"] == str(self.alpha)))
+
+    def test_asset_renamed_by_a_new_file_is_copied_under_the_new_name(self):
+        (self.vault / "A").mkdir()
+        image = self.vault / "A" / "img.png"
+        image.write_bytes(b"image in A")
+        self.alpha.write_text("![[A/img.png]]\n", encoding='utf-8')
+        self.session.refresh({self.alpha, image})
+        self.assertIn("../Assets/img.png", self.exported_alpha())
+
+        # Un archivo con el mismo nombre en la raíz pasa a ser el que resuelve `img.png`
+        taken = self.vault / "img.png"
+        taken.write_bytes(b"image at root")
+        self.session.refresh({taken})
+        self.assert_assets_match_note()
+        self.assertNotIn("../Assets/img.png", self.exported_alpha())
+
+        taken.unlink()
+        self.session.refresh({taken})
+        self.assert_assets_match_note()
+        self.assertIn("../Assets/img.png", self.exported_alpha())
+
+    def assert_assets_match_note(self):
+        """Cada adjunto enlazado por la nota existe y figura en el manifiesto con ese nombre."""
+        manifest = load_export_manifest(self.export_root)
+        outputs = {e["output"] for e in manifest["assets"]}
+        for name in re.findall(r"\.\./Assets/([^)]+)\)", self.exported_alpha()):
+            self.assertTrue((self.export_root / "Assets" / name).is_file(), name)
+            self.assertIn(f"Assets/{name}", outputs)
+            self.assertEqual((self.export_root / "Assets" / name).read_bytes(), b"image in A")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,279 @@
+import os
+import sys
+import json
+import hashlib
+import logging
+from pathlib import Path
+from urllib.parse import unquote
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Caché persistente del índice del vault ---
+# Cada vault (junto con su lista de carpetas excluidas) se guarda en un archivo
+# propio dentro del directorio de caché. Por cada directorio se almacena su
+# mtime y su listado, de modo que en ejecuciones posteriores solo se vuelven a
+# listar los directorios cuyo mtime ha cambiado.
+INDEX_CACHE_VERSION = 1
+
+
+def cache_key(vault_path: Path, exclude_folders: list) -> str:
+    return json.dumps([str(Path(vault_path).resolve()), sorted(exclude_folders)])
+
+
+def cache_file_for(cache_dir: Path, key: str, kind: str = "index") -> Path:
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    return cache_dir / f"{kind}_{digest}.json"
+
+
+def _load_cached_dirs(cache_file: Path, key: str) -> dict:
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != INDEX_CACHE_VERSION or data.get("key") != key:
+        return {}
+    return data.get("dirs", {})
+
+
+def _save_cached_dirs(cache_file: Path, key: str, dirs: dict):
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_suffix(".tmp")
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump({"version": INDEX_CACHE_VERSION, "key": key, "dirs": dirs}, f)
+    os.replace(tmp_file, cache_file)
+
+
+def scan_vault(vault_path: Path, exclude_folders: list, cached_dirs: dict | None = None) -> tuple[dict, int]:
+    """
+    Recorre el vault en el mismo orden que os.walk y devuelve el listado de cada
+    directorio ({ruta_relativa: [mtime_ns, archivos, subdirectorios]}) junto con
+    el número de directorios que hubo que volver a listar.
+    Los directorios cuyo mtime coincide con el de `cached_dirs` no se listan.
+    """
+    cached_dirs = cached_dirs or {}
+    exclude = set(exclude_folders)
+    root = str(vault_path)
+    dirs = {}
+    rescanned = 0
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        full_dir = os.path.join(root, rel_dir) if rel_dir else root
+        try:
+            mtime_ns = os.stat(full_dir).st_mtime_ns
+        except OSError:
+            continue
+
+        cached = cached_dirs.get(rel_dir)
+        if cached and cached[0] == mtime_ns:
+            files, subdirs = cached[1], cached[2]
+        else:
+            files, subdirs = [], []
+            try:
+                with os.scandir(full_dir) as it:
+                    for entry in it:
+                        try:
+                            is_dir = entry.is_dir()
+                        except OSError:
+                            is_dir = False
+                        if not is_dir:
+                            files.append(entry.name)
+                        elif entry.name not in exclude and not entry.is_symlink():
+                            subdirs.append(entry.name)
+            except OSError as e:
+                logging.warning(f"Could not list {full_dir}: {e}")
+            rescanned += 1
+
+        dirs[rel_dir] = [mtime_ns, files, subdirs]
+        # Orden inverso para que la pila visite los subdirectorios como os.walk
+        for sub in reversed(subdirs):
+            stack.append(os.path.join(rel_dir, sub) if rel_dir else sub)
+    return dirs, rescanned
+
+
+# --- Índice compacto ---
+# Cada archivo se guarda como un FileRecord (con __slots__) que apunta al directorio,
+# una única cadena compartida por todos los archivos de esa carpeta, y al nombre del
+# listado. La única clave es el stem en minúsculas; si varios archivos comparten stem
+# se guardan todos, en un orden determinista (ver `_candidate_order`).
+class FileRecord:
+    __slots__ = ("directory", "name")
+
+    def __init__(self, directory: str, name: str):
+        self.directory = directory
+        self.name = name
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, self.name)
+
+    def __eq__(self, other):
+        return isinstance(other, FileRecord) and self.directory == other.directory and self.name == other.name
+
+    def __hash__(self):
+        return hash((self.directory, self.name))
+
+    def __repr__(self):
+        return f"FileRecord({self.path!r})"
+
+
+class VaultIndex:
+    """
+    Índice del vault por stem. Un enlace se resuelve así:
+    1. Candidatos: los archivos cuyo nombre coincide con el del enlace; si no hay, los
+       que tienen el enlace como stem ([[Nota]]); si tampoco, los que comparten stem
+       (un [[Nota.pdf]] inexistente se resuelve a Nota.md, como hasta ahora).
+    2. Con carpeta ([[carpeta/Nota]]) se prefieren los candidatos cuya ruta termina en
+       esa carpeta.
+    3. Entre los que quedan gana el primero según `_candidate_order`: las notas .md
+       antes que otros archivos y, después, la ruta más corta.
+    """
+    def __init__(self, root: str, by_stem: dict, files: int):
+        self.root = root
+        self._by_stem = by_stem
+        self._files = files
+
+    @classmethod
+    def from_dirs(cls, vault_path: Path, dirs: dict) -> "VaultIndex":
+        root = str(vault_path)
+        by_stem = {}
+        files_count = 0
+        for rel_dir, (_, files, _) in dirs.items():
+            directory = sys.intern(os.path.join(root, rel_dir) if rel_dir else root)
+            for file in files:
+                record = FileRecord(directory, file)
+                stem = os.path.splitext(file)[0].lower()
+                existing = by_stem.get(stem)
+                if existing is None:
+                    by_stem[stem] = record
+                elif isinstance(existing, FileRecord):
+                    by_stem[stem] = [existing, record]
+                else:
+                    existing.append(record)
+            files_count += len(files)
+        index = cls(root, by_stem, files_count)
+        for stem, records in by_stem.items():
+            if not isinstance(records, FileRecord):
+                by_stem[stem] = tuple(sorted(records, key=index._candidate_order))
+        return index
+
+    def __len__(self) -> int:
+        return self._files
+
+    def _relative_dir(self, record: FileRecord) -> str:
+        """Carpeta del archivo relativa al vault, con "/" inicial y en minúsculas ("" en la raíz)."""
+        return record.directory[len(self.root):].replace(os.sep, "/").lower()
+
+    def _candidate_order(self, record: FileRecord) -> tuple:
+        rel_dir = self._relative_dir(record)
+        return (not record.name.lower().endswith('.md'), rel_dir.count("/"), rel_dir, record.name.lower())
+
+    def candidates(self, stem: str) -> tuple:
+        records = self._by_stem.get(stem)
+        if records is None:
+            return ()
+        return (records,) if isinstance(records, FileRecord) else records
+
+    def resolve(self, target: str) -> Path | None:
+        """Resuelve el destino de un enlace de Obsidian (ver la docstring de la clase)."""
+        folder, _, name = unquote(target.strip()).lower().replace("\\", "/").rpartition("/")
+        stem = os.path.splitext(name)[0]
+        records = self.candidates(stem)
+        candidates = [r for r in records if r.name.lower() == name]
+        if not candidates:
+            candidates = records if stem == name else (self.candidates(name) or records)
+        if len(candidates) > 1 and folder:
+            folder = "/".join(f for f in folder.split("/") if f not in ("", ".", ".."))
+            if folder:
+                candidates = [r for r in candidates if self._relative_dir(r).endswith("/" + folder)] or candidates
+        return Path(candidates[0].path) if candidates else None
+
+    def changed_keys(self, other: "VaultIndex") -> set[str]:
+        """Stems cuyos candidatos son distintos en `other`."""
+        keys = self._by_stem.keys() ^ other._by_stem.keys()
+        keys.update(stem for stem, records in self._by_stem.items()
+                    if stem in other._by_stem and other._by_stem[stem] != records)
+        return keys
+
+
+def build_index_from_dirs(vault_path: Path, dirs: dict) -> VaultIndex:
+    """Construye el índice compacto del vault a partir de los listados de directorios."""
+    return VaultIndex.from_dirs(vault_path, dirs)
+
+
+def load_vault_dirs(vault_path: Path, exclude_folders: list, cache_dir: Path, rebuild: bool = False) -> dict:
+    """
+    Devuelve los listados de directorios del vault reutilizando la caché en disco.
+    Con `rebuild=True` se ignora la caché y se recorre el vault completo.
+    """
+    key = cache_key(vault_path, exclude_folders)
+    cache_file = cache_file_for(cache_dir, key)
+    cached_dirs = {} if rebuild else _load_cached_dirs(cache_file, key)
+
+    dirs, rescanned = scan_vault(vault_path, exclude_folders, cached_dirs)
+    logging.info(f"Vault scan ({Path(vault_path).name}): {len(dirs) - rescanned} directories reused from cache, "
+                 f"{rescanned} rescanned.")
+
+    if rescanned or len(dirs) != len(cached_dirs):
+        try:
+            _save_cached_dirs(cache_file, key, dirs)
+        except OSError as e:
+            logging.warning(f"Could not save vault index cache: {e}")
+    return dirs
+
+
+def load_vault_index(vault_path: Path, exclude_folders: list, cache_dir: Path, rebuild: bool = False) -> VaultIndex:
+    """Devuelve el índice del vault reutilizando la caché en disco."""
+    dirs = load_vault_dirs(vault_path, exclude_folders, cache_dir, rebuild)
+    return build_index_from_dirs(vault_path, dirs)
+
+
+def iter_vault_files(vault_path: Path, dirs: dict):
+    """Itera las rutas completas (str) de todos los archivos listados en `dirs`."""
+    root = str(vault_path)
+    for rel_dir, (_, files, _) in dirs.items():
+        full_dir = os.path.join(root, rel_dir) if rel_dir else root
+        for file in files:
+            yield os.path.join(full_dir, file)
+
+
+def target_keys(target: str) -> tuple[str, str]:
+    """Claves del índice (stems) de las que depende la resolución de un enlace."""
+    name = unquote(target.strip()).lower().replace("\\", "/").rsplit("/", 1)[-1]
+    return name, os.path.splitext(name)[0]
+
+
+def resolve_target(index: VaultIndex, target: str) -> Path | None:
+    """Resuelve el destino de un enlace de Obsidian en el índice de un vault."""
+    return index.resolve(target)
+
+
+# --- Varios vaults ---
+# Cada vault tiene su propio índice (y su propia caché). La nota de inicio decide
+# a qué vault pertenece la exportación; sus enlaces se resuelven primero en ese
+# vault y, si se pide, después en los demás en el orden de la configuración.
+def find_owning_vault(path: Path, vault_paths: list) -> Path | None:
+    """Devuelve el vault que contiene `path` (el más interno si hay vaults anidados)."""
+    roots = {Path(vault).resolve(): Path(vault) for vault in vault_paths}
+    path = Path(path).resolve()
+    for parent in path.parents:
+        if parent in roots:
+            return roots[parent]
+    return None
+
+
+class MultiVaultIndex:
+    """Índices de varios vaults, en el orden de la configuración."""
+    def __init__(self, indexes: dict):
+        self.indexes = indexes
+
+    @classmethod
+    def load(cls, vault_paths: list, exclude_folders: list, cache_dir: Path, rebuild: bool = False):
+        """Construye (o carga de la caché) el índice de cada vault, todos a la vez."""
+        vault_paths = [Path(vault) for vault in vault_paths]
+        with ThreadPoolExecutor(max_workers=max(len(vault_paths), 1)) as pool:
+            indexes = pool.map(lambda vault: load_vault_index(vault, exclude_folders, cache_dir, rebuild), vault_paths)
+            return cls(dict(zip(vault_paths, indexes)))
+
+    def owning_vault(self, path: Path) -> Path | None:
+        return find_owning_vault(path, list(self.indexes))
@@ -0,0 +1,398 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+import argparse
+from pathlib import Path
+
+from vault_index import load_vault_dirs, scan_vault, build_index_from_dirs, iter_vault_files, target_keys, \
+    find_owning_vault
+from image_stage import ImageStage, image_settings_from_config
+from export_builder import (ExportBuilder, CONFIG_FILE, INDEX_CACHE_DIR, IMAGE_CACHE_DIR, MANIFEST_FILE_NAME,
+                            load_app_config, load_export_manifest)
+
+# --- Modo vigilancia ---
+# Mantiene en memoria el índice del vault y, por cada nota exportada, sus enlaces y
+# adjuntos ya resueltos. Cuando cambian archivos del vault (inotify en Linux; en otros
+# sistemas, o si inotify no está disponible, se comparan periódicamente los mtime):
+#   1. Se vuelven a listar solo los directorios cuyo mtime ha cambiado y, si cambia
+#      algún archivo, se reconstruye el índice y se marcan las notas que enlazan a
+#      los nombres cuya resolución ha cambiado.
+#   2. Se repite el recorrido con los datos en memoria: solo se leen las notas
+#      modificadas o marcadas, y solo se escriben las que cambian de verdad.
+# Las ráfagas de eventos (p. ej. el guardado automático del editor) se agrupan
+# esperando `debounce` segundos sin eventos nuevos.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+DEFAULT_DEBOUNCE = 0.3
+DEFAULT_POLL_INTERVAL = 1.0
+
+
+class InotifyWatcher:
+    """Vigila todos los directorios del vault con inotify (solo Linux), mediante ctypes."""
+    def __init__(self, vault_path: Path, exclude_folders: list, dirs: dict):
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._libc = libc
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify_init1 failed: {os.strerror(error)}")
+        self.vault_path = vault_path
+        self.exclude = set(exclude_folders)
+        self._directories = {}
+        try:
+            for rel_dir in dirs:
+                self._add_watch(os.path.join(str(vault_path), rel_dir) if rel_dir else str(vault_path))
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, directory: str):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"Cannot watch {directory}: {os.strerror(error)}")
+        self._directories[wd] = directory
+
+    def _watch_tree(self, directory: str):
+        """Añade vigilancia a un directorio nuevo y a sus subdirectorios."""
+        for root, subdirs, _ in os.walk(directory):
+            subdirs[:] = [d for d in subdirs if d not in self.exclude]
+            try:
+                self._add_watch(root)
+            except OSError as e:
+                logging.warning(f"{e}. Changes in that folder will not be detected.")
+
+    def wait(self, timeout: float | None) -> set[Path]:
+        """Espera eventos hasta `timeout` segundos y devuelve las rutas afectadas."""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        changed = set()
+        while ready:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+                offset += EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW:
+                    # Se han perdido eventos: el vault completo cuenta como modificado
+                    changed.add(self.vault_path)
+                    continue
+                directory = self._directories.get(wd)
+                if directory is None:
+                    continue
+                if mask & IN_IGNORED:
+                    del self._directories[wd]
+                    continue
+                path = os.path.join(directory, os.fsdecode(name)) if name else directory
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and os.fsdecode(name) not in self.exclude:
+                    self._watch_tree(path)
+                changed.add(Path(path))
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Alternativa portátil: compara cada `interval` segundos el mtime y el tamaño de los archivos."""
+    def __init__(self, vault_path: Path, exclude_folders: list, dirs: dict, interval: float = DEFAULT_POLL_INTERVAL):
+        self.vault_path = vault_path
+        self.exclude_folders = exclude_folders
+        self.interval = interval
+        self._dirs = dirs
+        self._snapshot = self._stat_files()
+
+    def _stat_files(self) -> dict:
+        snapshot = {}
+        for path in iter_vault_files(self.vault_path, self._dirs):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def wait(self, timeout: float | None) -> set[Path]:
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        self._dirs, _ = scan_vault(self.vault_path, self.exclude_folders, self._dirs)
+        snapshot = self._stat_files()
+        changed = {Path(p) for p in snapshot.keys() ^ self._snapshot.keys()}
+        changed |= {Path(p) for p, stat in snapshot.items() if self._snapshot.get(p, stat) != stat}
+        self._snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+class WatchSession:
+    """
+    Exportación que se mantiene al día. Guarda el resultado de la última lectura de
+    cada nota (sin el contenido) y, para cada clave del índice, las notas cuyos
+    enlaces o adjuntos dependen de ella.
+    """
+    def __init__(self, vault_path: Path, export_root: Path, start_note_path: Path, max_depth: int,
+                 exclude_folders: list, convert_formats: list | None = None, image_stage: ImageStage | None = None):
+        self.vault_path = vault_path
+        self.start_note_path = start_note_path
+        self.max_depth = max_depth
+        self.exclude_folders = exclude_folders
+        self.convert_formats = convert_formats or []
+        self.dirs = load_vault_dirs(vault_path, exclude_folders, INDEX_CACHE_DIR)
+        self.index = build_index_from_dirs(vault_path, self.dirs)
+        update_dir = export_root if load_export_manifest(export_root) else None
+        self.builder = ExportBuilder(vault_path, export_root.parent, exclude_folders, update_dir=update_dir,
+                                     vault_index=self.index, export_name=export_root.name, image_stage=image_stage)
+        self.builder.log_notes = False
+        self.notes = {}
+        self._note_keys = {}
+        self._referrers = {}
+        self._touched = set()
+        self._notes_read = 0
+        self._first_run = True
+
+    def refresh(self, changed: set[Path]):
+        """Actualiza el índice y la exportación tras los cambios en `changed`."""
+        started = time.perf_counter()
+        if self.vault_path in changed:
+            self.notes.clear()
+        self._forget_listings(changed)
+        dirs, rescanned = scan_vault(self.vault_path, self.exclude_folders, self.dirs)
+        if rescanned or dirs.keys() != self.dirs.keys():
+            self.dirs = dirs
+            index = build_index_from_dirs(self.vault_path, dirs)
+            changed_keys = self.index.changed_keys(index)
+            for key in changed_keys:
+                self._touched |= self._referrers.get(key, set())
+            self.index = self.builder.vault_index = index
+        self._touched |= {path for path in changed if path.suffix.lower() == ".md"}
+
+        if self._first_run or self.vault_path in changed or not self._rewrite_in_place(changed):
+            self._export()
+        elif not self._notes_read:
+            logging.info("Changes do not affect the export.")
+            return
+        counters = self.builder.metrics.counters
+        logging.info(f"Export updated in {(time.perf_counter() - started) * 1000:.0f} ms: "
+                     f"{self._notes_read} notes read, {counters.get('notes_written', 0)} written, "
+                     f"{counters.get('outputs_removed', 0)} removed.")
+        if self.convert_formats:
+            self._convert()
+
+    def _forget_listings(self, changed: set[Path]):
+        """
+        Olvida el listado de los directorios en los que se ha creado o borrado algo, para
+        que `scan_vault` los vuelva a listar: si dos cambios caen en el mismo tick del
+        reloj, el mtime del directorio no cambia.
+        """
+        root = str(self.vault_path)
+        for path in changed:
+            rel_dir = os.path.relpath(path.parent, root)
+            rel_dir = "" if rel_dir == "." else rel_dir
+            cached = self.dirs.get(rel_dir)
+            if cached and (path.name in cached[1] or path.name in cached[2]) != path.exists():
+                del self.dirs[rel_dir]
+
+    def _export(self):
+        if not self._first_run:
+            self.builder.reset_for_update()
+        self._notes_read = 0
+        self.builder.run(self.start_note_path, self.max_depth, visit=self._visit)
+        self._first_run = False
+        self._touched.clear()
+        # Las notas que ya no se exportan se olvidan: su salida se ha borrado y, si vuelven
+        # a alcanzarse, hay que leerlas y escribirlas de nuevo
+        for note_path in self.notes.keys() - self.builder.processed_notes:
+            self._forget(note_path)
+
+    def _rewrite_in_place(self, changed: set[Path]) -> bool:
+        """
+        Camino rápido para el caso habitual: se han editado notas ya exportadas sin
+        cambiar sus enlaces ni sus adjuntos, o los cambios no afectan a la exportación.
+        Solo se reescriben esas notas y el manifiesto; devuelve False si hay que
+        repetir el recorrido completo.
+        """
+        if any(path in self.builder.copied_assets for path in changed):
+            return False
+        notes = {}
+        self.builder.prepare_rewrite()
+        for note_path in self._touched & self.builder.processed_notes:
+            old = self.notes.get(note_path)
+            if old is None or not note_path.exists():
+                return False
+            note = self.builder._read_note(note_path)
+            self._remember(note_path, note)
+            notes[note_path] = note
+            # Los enlaces repetidos no cambian el recorrido: se compara la primera aparición de cada uno
+            if (list(dict.fromkeys(note.linked_notes)) != list(dict.fromkeys(old.linked_notes))
+                    or set(note.assets) != set(old.assets)):
+                return False
+            # Un archivo nuevo (o borrado) puede cambiar el nombre de salida de un adjunto
+            # sin cambiar cuál es: hay que copiarlo con el nombre nuevo
+            if (note.entry or {}).get("assets") != (old.entry or {}).get("assets"):
+                return False
+        self._notes_read = len(notes)
+        if notes:
+            self.builder.rewrite_notes(self.start_note_path, self.max_depth, notes)
+        self._touched.clear()
+        return True
+
+    def _visit(self, note_path: Path) -> list[Path]:
+        note = self.notes.get(note_path)
+        if note is None or note_path in self._touched:
+            note = self.builder._read_note(note_path)
+            self._remember(note_path, note)
+            self._notes_read += 1
+        self.builder._write_note(note_path, note)
+        return note.linked_notes
+
+    def _remember(self, note_path: Path, note):
+        """Guarda la nota leída (sin contenido) y las claves del índice de las que depende."""
+        self._forget(note_path)
+        self.notes[note_path] = note._replace(content=None)
+        keys = set()
+        if note.entry is not None:
+            for target in note.entry["targets"]:
+                keys.update(target_keys(target))
+            for source in note.entry["assets"]:
+                keys.update(target_keys(Path(source).name))
+        self._note_keys[note_path] = keys
+        for key in keys:
+            self._referrers.setdefault(key, set()).add(note_path)
+
+    def _forget(self, note_path: Path):
+        self.notes.pop(note_path, None)
+        for key in self._note_keys.pop(note_path, ()):
+            self._referrers[key].discard(note_path)
+
+    def _convert(self):
+        try:
+            from document_converter import convert_export, manifest_input_files, OUTPUT_SUBFOLDER_NAME
+        except ImportError as e:
+            logging.error(f"Cannot load document_converter: {e}"); return
+        export_root = self.builder.export_root
+        try:
+            inputs = manifest_input_files(export_root)
+        except FileNotFoundError as e:
+            logging.error(f"Cannot convert the export: {e}"); return
+        if inputs is None:
+            logging.warning("The export has no notes to convert (is the start note missing?)."); return
+        input_files, _ = inputs
+        output_dir = export_root / OUTPUT_SUBFOLDER_NAME
+        output_dir.mkdir(exist_ok=True)
+        try:
+            results = convert_export(input_files, export_root, output_dir, self.convert_formats)
+        except Exception as e:
+            logging.error(f"Conversion failed: {e}"); return
+        for fmt, result in results.items():
+            if not result["ok"]:
+                logging.error(f"Conversion to {fmt} failed: {result['error']}")
+
+    def serve(self, watcher, debounce: float = DEFAULT_DEBOUNCE):
+        """Bucle principal: agrupa los eventos de cada ráfaga y actualiza la exportación."""
+        logging.info(f"Watching {self.vault_path} ({type(watcher).__name__}). Press Ctrl+C to stop.")
+        pending = set()
+        while True:
+            changed = watcher.wait(None)
+            if not changed:
+                continue
+            # Se espera a que pasen `debounce` segundos sin eventos (como mucho 10 veces ese tiempo)
+            deadline = time.monotonic() + debounce
+            limit = time.monotonic() + debounce * 10
+            while (remaining := min(deadline, limit) - time.monotonic()) > 0:
+                more = watcher.wait(remaining)
+                if more:
+                    changed |= more
+                    deadline = time.monotonic() + debounce
+            # Un error (p. ej. un archivo que desaparece mientras se lee) no detiene la
+            # vigilancia: con el siguiente evento se repite el recorrido completo
+            try:
+                self.refresh(changed | pending)
+                pending = set()
+            except Exception as e:
+                logging.exception(f"Could not update the export: {e}")
+                pending = {self.vault_path}
+
+
+def main():
+    """Mantiene una exportación al día mientras se editan las notas del vault."""
+    parser = argparse.ArgumentParser(description="Vigila el vault y actualiza una exportación cuando cambia.")
+    parser.add_argument("export_dir", type=Path,
+                        help="Carpeta de la exportación. Si ya tiene manifiesto se usan su nota de inicio y su profundidad.")
+    parser.add_argument("--start-note", type=Path, help="Nota de inicio (solo para crear una exportación nueva).")
+    parser.add_argument("--depth", type=int, default=1, help="Profundidad máxima (-1 = sin límite).")
+    parser.add_argument("--vault", type=Path, help="Vault de la nota (por defecto, el que la contiene).")
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE, metavar="SECONDS",
+                        help="Tiempo sin eventos antes de actualizar la exportación.")
+    parser.add_argument("--poll", action="store_true", help="Usa sondeo periódico en lugar de inotify.")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL, metavar="SECONDS")
+    parser.add_argument("--convert", nargs="+", metavar="FORMAT",
+                        help="Convierte la exportación a estos formatos tras cada actualización (p. ej. pdf).")
+    args = parser.parse_args()
+
+    config = (load_app_config() if CONFIG_FILE.exists() else None) or {}
+    exclude_folders = config.get("exclude_folders", [])
+    export_root = args.export_dir.absolute()
+    manifest = load_export_manifest(export_root)
+    if manifest:
+        vault_path = Path(manifest["vault_path"])
+        start_note_path = Path(manifest["start_note"])
+        max_depth = manifest["max_depth"]
+    elif args.start_note:
+        start_note_path = args.start_note.absolute()
+        vault_paths = [args.vault.absolute()] if args.vault else [Path(v) for v in config.get("vault_paths", [])]
+        vault_path = find_owning_vault(start_note_path, vault_paths)
+        if not vault_path:
+            logging.error(f"The start note is not inside any configured vault: {start_note_path}")
+            sys.exit(1)
+        max_depth = args.depth
+    else:
+        logging.error(f"No valid '{MANIFEST_FILE_NAME}' in {export_root}. Use --start-note to create the export.")
+        sys.exit(1)
+
+    image_stage = ImageStage.create(IMAGE_CACHE_DIR, image_settings_from_config(config))
+    session = WatchSession(vault_path, export_root, start_note_path, max_depth, exclude_folders, args.convert,
+                           image_stage)
+    session.refresh(set())
+    if args.poll:
+        watcher = PollingWatcher(vault_path, exclude_folders, session.dirs, args.poll_interval)
+    else:
+        try:
+            watcher = InotifyWatcher(vault_path, exclude_folders, session.dirs)
+        except (OSError, AttributeError) as e:
+            logging.warning(f"inotify not available ({e}); falling back to polling every {args.poll_interval}s.")
+            watcher = PollingWatcher(vault_path, exclude_folders, session.dirs, args.poll_interval)
+    try:
+        session.serve(watcher, args.debounce)
+    except KeyboardInterrupt:
+        logging.info("Watch mode stopped.")
+    finally:
+        watcher.close()
+        if image_stage:
+            image_stage.close()
+
+
+if __name__ == "__main__":
+    main()